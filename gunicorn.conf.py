@@ -0,0 +1,27 @@
+"""Gunicorn部署配置
+
+启动方式: gunicorn main:app -c gunicorn.conf.py
+
+注意: /chat 创建的流保存在进程内的StreamManager中，同一会话的 /chat 和
+/stream/{chat_id} 请求必须落在同一个worker上。未接入共享的流存储(如Redis)前，
+多worker部署需要在负载均衡层按客户端做会话保持，否则 /stream 会找不到流；
+/execute_workflow 等无状态接口不受影响。
+"""
+
+import os
+
+# 监听地址
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+# worker数量，默认单进程以保证流式会话可用，配置会话保持后可按 CPU核数*2+1 调大
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+
+# SSE为长连接，优雅退出时给正在进行的流留出结束时间
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = 5
+
+# 先加载应用再fork，节点注册和模板预编译只执行一次，子进程共享内存页
+preload_app = True
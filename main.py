@@ -2,36 +2,60 @@
 
 import os
 import logging
-import json
-import importlib
 import asyncio
-from datetime import datetime
+import tempfile
+from functools import wraps
 from typing import Dict, Any, Optional, Union, AsyncGenerator
 from fastapi import FastAPI, HTTPException, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from sse_starlette.sse import EventSourceResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+import jinja2
+import orjson
 from src.utils.logger import setup_logger
 
-from src.core.engine import WorkflowEngine, NodeResult
+from src.core.engine import WorkflowEngine
 from src.core.node_config import NodeConfigManager
 from src.api.workflow_service import WorkflowService
 from src.api.stream_manager import StreamManager
+from src.api.bootstrap import node_status_callback, register_all_nodes
+from src.api.middleware import SSEAwareGZipMiddleware
 from src.api.events import (
-    create_status_event, create_workflow_event, create_result_event,
-    create_answer_event, create_complete_event,
+    create_status_event, create_workflow_event, create_node_result_event,
+    create_answer_chunk_event, create_explanation_chunk_event, create_complete_event,
     create_error_event
 )
-from src.api.utils import convert_node_result
-from src.api.llm_api import call_llm_api_stream
-from src.agent.agent import Agent
+from src.api.utils import coalesce_json_strings, convert_node_result, generate_id
+from src.api.llm_api import call_llm_api_stream_json, close_session, get_session
+from src.agent.agent import Agent, Cache
+
+# 使用基于libuv的事件循环，Windows等不支持的平台回退到默认事件循环
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    uvloop = None
+
 # 加载环境变量
 from dotenv import load_dotenv
 load_dotenv()
 
+# SSE保活注释帧及发送间隔(秒)
+SSE_KEEPALIVE_FRAME = b": keepalive\n\n"
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+# 工作流执行完成后是否调用大模型生成执行说明，默认关闭
+WORKFLOW_EXPLAIN = os.getenv("WORKFLOW_EXPLAIN", "false").lower() == "true"
+
+# 直接回答时固定的系统消息，作为可缓存前缀在所有请求间复用
+ANSWER_SYSTEM_MESSAGES = [{"role": "system", "content": "请根据用户问题提供简洁准确的回答。"}]
+
+# 流式回答和解释内容的合并窗口(毫秒)，窗口内到达的token合并为一个SSE事件，0表示逐token发送
+STREAM_COALESCE_WINDOW = int(os.getenv("STREAM_COALESCE_MS", "15")) / 1000
+
 # 获取日志文件路径
 log_file_path = os.getenv('log_file_path', 'logs/workflow_engine.log')
 
@@ -40,47 +64,63 @@ logger = setup_logger(log_file_path)
 module_logger = logging.getLogger(__name__)
 
 # 创建全局实例
-engine = WorkflowEngine()
-workflow_service = WorkflowService(engine)
-stream_manager = StreamManager()
+# 引擎线程池在启动时设为事件循环的默认执行器，限制所有阻塞任务的并发数
+engine = WorkflowEngine(max_workers=int(os.getenv("ENGINE_MAX_WORKERS", "16")))
 node_manager = NodeConfigManager(engine=engine)
-# 注册节点状态回调
-def node_status_callback(workflow_id: str, node_id: str, result: NodeResult):
-    """处理节点状态变化的回调函数"""
-    return convert_node_result(node_id, result)
+workflow_service = WorkflowService(engine, node_manager)
+stream_manager = StreamManager(
+    max_queue_size=int(os.getenv("STREAM_QUEUE_SIZE", "256")),
+    put_timeout=float(os.getenv("STREAM_PUT_TIMEOUT", "60"))
+)
+# 语义缓存会把相似问题的最终答案复用到其他会话，只适合不含用户私有上下文的单租户部署，默认关闭
+AGENT_SEMANTIC_CACHE = os.getenv("AGENT_SEMANTIC_CACHE", "false").lower() == "true"
+# Agent语义缓存，在所有请求间共享；完全相同的模型请求由LLM接口层的缓存处理
+agent_response_cache = Cache[str](
+    maxsize=int(os.getenv("AGENT_CACHE_SIZE", "100")),
+    ttl=int(os.getenv("AGENT_CACHE_TTL", "3600"))
+) if AGENT_SEMANTIC_CACHE else None
 
-engine.register_node_callback(node_status_callback)
+# 聊天任务准入控制：限制同时执行的任务数，排队过多时直接拒绝新请求
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "32"))
+MAX_PENDING_CHATS = int(os.getenv("MAX_PENDING_CHATS", "64"))
+_chat_admission = asyncio.Condition()
+_active_chats = 0
+_pending_chats = 0
 
-# 在启动时注册所有节点类型
-def register_all_nodes():
-    """注册所有可用的节点类型"""
-    node_configs = node_manager.node_configs
+def with_chat_admission(func):
+    """聊天任务准入控制装饰器
     
-    for class_name in node_configs.keys():
-        # 获取节点配置中定义的type
-        node_type = node_configs[class_name].get('type')
-        if not node_type:
-            module_logger.warning(f"节点 {class_name} 未配置type字段，跳过注册")
-            continue
-            
-        # 从type生成模块名
-        module_name = node_type
-        
+    任务在执行前等待空闲名额，结束后释放名额并唤醒一个等待者。
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        global _active_chats, _pending_chats
+        async with _chat_admission:
+            _pending_chats += 1
+            try:
+                await _chat_admission.wait_for(lambda: _active_chats < MAX_CONCURRENT_CHATS)
+            finally:
+                _pending_chats -= 1
+            _active_chats += 1
         try:
-            # 动态导入节点模块
-            module = importlib.import_module(f"src.nodes.{module_name}")
-            node_class = getattr(module, class_name)
-            # 使用配置的type注册节点类型
-            engine.register_node_type(node_type, node_class)
-            node_manager.register_node_type(node_type, node_class)
-        except Exception as e:
-            module_logger.error(f"注册节点类型 {module_name} 失败: {str(e)}")
-            raise
+            return await func(*args, **kwargs)
+        finally:
+            async with _chat_admission:
+                _active_chats -= 1
+                _chat_admission.notify(1)
+    return wrapper
+
+# 注册节点状态回调
+engine.register_node_callback(node_status_callback)
 
 # 在应用启动时注册所有节点
-register_all_nodes()
+register_all_nodes(engine, node_manager)
 
-app = FastAPI(title="Workflow Engine API",version="1.0.0")
+app = FastAPI(
+    title="Workflow Engine API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # 使用orjson序列化JSON响应
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -92,12 +132,45 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# 压缩JSON和页面等普通响应，SSE流和NDJSON流路径不压缩
+app.add_middleware(
+    SSEAwareGZipMiddleware,
+    minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "512")),
+    excluded_prefixes=("/stream/", "/execute_workflow")
+)
+
 # 挂载静态文件目录
 static_path = os.path.join(os.path.dirname(__file__), "static")
 app.mount("/static", StaticFiles(directory=static_path), name="static")
 
-# 创建模板引擎
+# 创建模板引擎，关闭自动重载并启用字节码缓存
 templates = Jinja2Templates(directory=static_path)
+templates.env.auto_reload = False
+jinja_cache_dir = os.getenv("JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jinja_cache"))
+os.makedirs(jinja_cache_dir, exist_ok=True)
+templates.env.bytecode_cache = jinja2.FileSystemBytecodeCache(directory=jinja_cache_dir)
+
+# 启动时预编译所有页面模板，避免首次请求时编译
+for template_name in templates.env.list_templates(extensions=["html"]):
+    templates.env.get_template(template_name)
+
+@app.on_event("startup")
+async def on_startup():
+    """应用启动时配置事件循环和默认线程池、记录运行环境并创建共享的LLM HTTP会话"""
+    loop = asyncio.get_running_loop()
+    # Python 3.12+ 的eager任务会同步执行到第一次真正挂起，减少短协程的调度开销
+    if hasattr(asyncio, "eager_task_factory"):
+        loop.set_task_factory(asyncio.eager_task_factory)
+    module_logger.info("事件循环: %s, 任务工厂: %s", loop.__class__, loop.get_task_factory())
+    # 同步节点和节点内部的阻塞调用统一使用引擎的线程池
+    engine.install_default_executor()
+    # 在当前事件循环中提前创建共享的LLM HTTP会话，首个请求不再承担创建开销
+    await get_session()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """应用退出时关闭共享的LLM HTTP会话"""
+    await close_session()
 
 class ApiResponse(BaseModel):
     """统一的API响应模型"""
@@ -110,7 +183,7 @@ class WorkflowRequest(BaseModel):
     workflow: Dict[str, Any] = Field(
         ...,
         description="工作流定义，包含nodes和edges",
-        example={
+        examples=[{
             "nodes": [
                 {
                     "id": "add1",
@@ -119,13 +192,16 @@ class WorkflowRequest(BaseModel):
                 }
             ],
             "edges": []
-        }
+        }]
     )
     global_params: Optional[Dict[str, Any]] = Field(
         None,
         description="全局参数，可在所有节点中访问"
     )
 
+# 直接用pydantic-core从原始请求体解析并校验，省去FastAPI先用标准库json解析请求体的开销
+workflow_request_adapter = TypeAdapter(WorkflowRequest)
+
 class NodeResultResponse(BaseModel):
     success: bool = Field(..., description="节点执行是否成功")
     data: Optional[Dict[str, Any]] = Field(None, description="节点执行结果数据")
@@ -164,9 +240,13 @@ async def create_chat(text: str = Body(..., embed=True),model: str = Body(..., e
     Returns:
         dict: 包含chat_id的响应
     """
-    chat_id = f"chat-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    if _pending_chats >= MAX_PENDING_CHATS:
+        raise HTTPException(status_code=503, detail="Server busy, please retry later")
+        
+    chat_id = generate_id("chat")
     stream_manager.create_stream(chat_id)
     
+    # 启动时已设置eager任务工厂，任务会立即执行到第一次等待LLM响应
     if model == "workflow":
         # 启动工作流异步任务处理用户请求
         asyncio.create_task(process_workflow(chat_id, text))
@@ -185,106 +265,132 @@ async def create_chat(text: str = Body(..., embed=True),model: str = Body(..., e
 async def stream_request(chat_id: str):
     """建立SSE连接获取响应流
     
+    消息为预先格式化的事件帧，按原样写出；空闲时定期发送保活注释帧。
+    
     Args:
         chat_id: 聊天会话ID
         
     Returns:
-        EventSourceResponse: SSE响应
+        StreamingResponse: SSE响应
     """
     async def event_generator():
+        messages = stream_manager.get_messages(chat_id)
+        next_message = asyncio.ensure_future(anext(messages))
+        keepalive = asyncio.ensure_future(asyncio.sleep(SSE_KEEPALIVE_INTERVAL))
         try:
-            async for message in stream_manager.get_messages(chat_id):
-                yield message
+            while True:
+                # 等待消息或保活计时器，不依赖超时异常控制流程
+                done, _ = await asyncio.wait(
+                    {next_message, keepalive},
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if next_message in done:
+                    try:
+                        message = next_message.result()
+                    except StopAsyncIteration:
+                        break
+                    yield message
+                    next_message = asyncio.ensure_future(anext(messages))
+                if keepalive in done:
+                    yield SSE_KEEPALIVE_FRAME
+                    keepalive = asyncio.ensure_future(asyncio.sleep(SSE_KEEPALIVE_INTERVAL))
         except ValueError as e:
-            yield await create_error_event(f"Stream not found: {str(e)}")
+            yield create_error_event(f"Stream not found: {str(e)}")
+        finally:
+            next_message.cancel()
+            keepalive.cancel()
             
-    return EventSourceResponse(event_generator())
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 禁止nginx等反向代理缓冲SSE流
+        }
+    )
 
+@with_chat_admission
 async def process_workflow(chat_id: str, text: str):
     """处理用户请求的异步函数
     
+    工作流执行完成后，只有开启WORKFLOW_EXPLAIN时才会再调用一次大模型生成执行说明，
+    说明内容更友好，但会额外增加一次模型调用的耗时和token消耗。
+    
     Args:
         chat_id: 聊天会话ID
         text: 用户输入的文本
     """
-    module_logger.info(f"[{chat_id}] 开始处理请求: {text[:100]}...")
+    module_logger.info("[%s] 开始处理请求: %.100s...", chat_id, text)
     try:
         # 开始生成工作流
-        module_logger.info(f"[{chat_id}] 开始生成工作流")
-        await stream_manager.send_message(chat_id, await create_status_event("generating", "正在生成工作流..."))
+        module_logger.info("[%s] 开始生成工作流", chat_id)
+        await stream_manager.send_message(chat_id, create_status_event("generating", "正在生成工作流..."), droppable=True)
         workflow = await workflow_service.generate_workflow(text, chat_id)
         
         if not workflow or not workflow.get("nodes"):
             # 如果没有生成工作流，直接返回普通回答
-            module_logger.info(f"[{chat_id}] 无工作流生成，转为生成普通回答")
-            await stream_manager.send_message(chat_id, await create_status_event("answering", "正在生成回答..."))
+            module_logger.info("[%s] 无工作流生成，转为生成普通回答", chat_id)
+            await stream_manager.send_message(chat_id, create_status_event("answering", "正在生成回答..."), droppable=True)
             try:
-                messages = [
-                    {"role": "system", "content": "请根据用户问题提供简洁准确的回答。"},
-                    {"role": "user", "content": text}
-                ]
-                async for chunk in call_llm_api_stream(messages, chat_id):
-                    await stream_manager.send_message(chat_id, await create_answer_event({
-                        "event": "answer",
-                        "success": True,
-                        "data": chunk
-                    }))
-                await stream_manager.send_message(chat_id, await create_complete_event())
+                messages = [{"role": "user", "content": text}]
+                # 增量内容以JSON字节直接拼接进回答事件，并按时间窗口合并相邻token
+                async for chunk in coalesce_json_strings(
+                    call_llm_api_stream_json(messages, chat_id, ANSWER_SYSTEM_MESSAGES),
+                    STREAM_COALESCE_WINDOW
+                ):
+                    await stream_manager.send_message(chat_id, create_answer_chunk_event(chunk))
+                await stream_manager.send_message(chat_id, create_complete_event())
             except Exception as e:
-                module_logger.error(f"[{chat_id}] 生成回答时发生错误: {str(e)}", exc_info=True)
-                await stream_manager.send_message(chat_id, await create_error_event("生成回答失败，请稍后重试"))
+                module_logger.error("[%s] 生成回答时发生错误: %s", chat_id, e, exc_info=True)
+                await stream_manager.send_message(chat_id, create_error_event("生成回答失败，请稍后重试"))
             return
             
         # 发送工作流定义
-        module_logger.info(f"[{chat_id}] 工作流生成成功，节点数: {len(workflow.get('nodes', []))}")
-        await stream_manager.send_message(chat_id, await create_workflow_event(workflow))
-        await asyncio.sleep(0.1)  # 添加小延迟使前端显示更流畅
+        module_logger.info("[%s] 工作流生成成功，节点数: %d", chat_id, len(workflow.get("nodes", [])))
+        await stream_manager.send_message(chat_id, create_workflow_event(workflow))
         
         # 开始执行工作流
-        await stream_manager.send_message(chat_id, await create_status_event("executing", "正在执行工作流..."))
-        workflow_id = f"workflow-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        await stream_manager.send_message(chat_id, create_status_event("executing", "正在执行工作流..."), droppable=True)
+        workflow_id = generate_id("workflow")
         
         try:
-            module_logger.info(f"[{chat_id}] 开始执行工作流: {workflow_id}")
+            module_logger.info("[%s] 开始执行工作流: %s", chat_id, workflow_id)
             # 使用流式执行工作流
             # 执行工作流并处理结果流
             # 使用流式执行并实时发送结果
             async for node_id, result in engine.execute_workflow_stream(
-                json.dumps(workflow),
+                workflow,
                 workflow_id,
                 {}
             ):
-                module_logger.info(f"[{chat_id}] 节点 {node_id} 执行状态: status={result.status} 执行结果：success={result.success}")
-                # 使用工具函数转换结果为可序列化的字典
-                result_dict = convert_node_result(node_id, result)
-                # 立即发送节点状态更新
-                event = await create_result_event(node_id, result_dict)
+                module_logger.info("[%s] 节点 %s 执行状态: status=%s 执行结果：success=%s", chat_id, node_id, result.status, result.success)
+                # 直接序列化节点结果并立即发送状态更新
+                event = create_node_result_event(node_id, result)
                 await stream_manager.send_message(chat_id, event)
-                # 添加小延迟确保前端能够正确接收和处理事件
-                await asyncio.sleep(0.01)
             
             # 获取工作流执行结果并生成说明
-            # module_logger.info(f"[{chat_id}] 开始生成执行说明")
-            # workflow_results = engine.get_workflow_progress(workflow_id)
-            # async for chunk in workflow_service.explain_workflow_result(text, workflow, workflow_results, chat_id):
-            #     await stream_manager.send_message(chat_id, await create_explanation_event({
-            #         "event": "explanation",
-            #         "success": True,
-            #         "data": chunk
-            #     }))
-            await stream_manager.send_message(chat_id, await create_complete_event())
-            module_logger.info(f"[{chat_id}] 工作流执行完成")
+            if WORKFLOW_EXPLAIN:
+                module_logger.info("[%s] 开始生成执行说明", chat_id)
+                workflow_results = engine.get_workflow_progress(workflow_id)
+                async for chunk in coalesce_json_strings(
+                    workflow_service.explain_workflow_result(text, workflow, workflow_results, chat_id),
+                    STREAM_COALESCE_WINDOW
+                ):
+                    await stream_manager.send_message(chat_id, create_explanation_chunk_event(chunk))
+            await stream_manager.send_message(chat_id, create_complete_event())
+            module_logger.info("[%s] 工作流执行完成", chat_id)
             
         except Exception as e:
             error_msg = f"执行工作流失败: {str(e)}"
-            module_logger.error(f"[{chat_id}] {error_msg}", exc_info=True)
-            await stream_manager.send_message(chat_id, await create_error_event(error_msg))
+            module_logger.error("[%s] %s", chat_id, error_msg, exc_info=True)
+            await stream_manager.send_message(chat_id, create_error_event(error_msg))
             
     except Exception as e:
         error_msg = f"处理请求失败: {str(e)}"
-        module_logger.error(f"[{chat_id}] {error_msg}", exc_info=True)
-        await stream_manager.send_message(chat_id, await create_error_event(error_msg))
+        module_logger.error("[%s] %s", chat_id, error_msg, exc_info=True)
+        await stream_manager.send_message(chat_id, create_error_event(error_msg))
 
+@with_chat_admission
 async def process_agent(chat_id: str, text: str,itecount: int):
     """处理Agent请求的异步函数
     
@@ -292,78 +398,115 @@ async def process_agent(chat_id: str, text: str,itecount: int):
         chat_id: 聊天会话ID
         text: 用户输入的文本
     """
-    module_logger.info(f"[{chat_id}] 开始处理Agent请求: {text[:100]}...")
+    module_logger.info("[%s] 开始处理Agent请求: %.100s...", chat_id, text)
     try:
         # 获取工具集合并实例化Agent，传入stream_manager
         tools = node_manager.get_tools()
-        agent = Agent(tools=tools, stream_manager=stream_manager,max_iterations=itecount)
+        agent = Agent(
+            tools=tools,
+            stream_manager=stream_manager,
+            max_iterations=itecount,
+            response_cache=agent_response_cache,
+            semantic_cache=AGENT_SEMANTIC_CACHE
+        )
         
         # 开始处理Agent请求
-        # await stream_manager.send_message(chat_id, await create_status_event("agent_processing", "开始处理Agent请求"))
+        # await stream_manager.send_message(chat_id, create_status_event("agent_processing", "开始处理Agent请求"))
         
         # 调用Agent的run方法，启用stream功能
         await agent.run(text, chat_id)
         
-        await stream_manager.send_message(chat_id, await create_complete_event())
+        await stream_manager.send_message(chat_id, create_complete_event())
     except Exception as e:
         error_msg = f"处理Agent请求失败: {str(e)}"
-        module_logger.error(f"[{chat_id}] {error_msg}", exc_info=True)
-        await stream_manager.send_message(chat_id, await create_error_event(error_msg))
-@app.post("/execute_workflow", response_model=ApiResponse)
-async def execute_workflow(request: WorkflowRequest):
+        module_logger.error("[%s] %s", chat_id, error_msg, exc_info=True)
+        await stream_manager.send_message(chat_id, create_error_event(error_msg))
+@app.post(
+    "/execute_workflow",
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": WorkflowRequest.model_json_schema()}},
+            "required": True
+        }
+    }
+)
+async def execute_workflow(raw_request: Request):
     """
     执行工作流
     
-    根据提供的工作流定义执行工作流，返回统一的事件格式
+    根据提供的工作流定义执行工作流，以NDJSON流式返回统一的事件格式，
+    每个节点执行完成即输出一行，无需等待整个工作流结束
     
     Args:
-        request: 包含工作流定义的请求
+        raw_request: 原始请求，请求体为WorkflowRequest格式的JSON
         
     Returns:
-        ApiResponse: 包含工作流执行结果的统一响应
+        StreamingResponse: 每行一个ApiResponse格式的JSON对象，依次为workflow、
+        node_result(每个节点一行)，最后为complete或error
     """
-    request_id = f"req-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    module_logger.info(f"[{request_id}] 收到执行工作流请求")
     try:
-        workflow_id = f"workflow-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        # 记录工作流定义
-        workflow_json = json.dumps(request.workflow, indent=2)
-        module_logger.info(f"[{request_id}] 工作流定义:\n{workflow_json}")
-        
-        # 发送工作流事件
-        workflow_event = await create_workflow_event(request.workflow)
-        
-        # 使用流式执行工作流
-        events = []
-        async for node_id, result in engine.execute_workflow_stream(
-            json.dumps(request.workflow),
-            workflow_id,
-            request.global_params or {}
-        ):
-            # 使用工具函数转换结果为可序列化的字典
-            result_dict = convert_node_result(node_id, result)
-            node_event = await create_result_event(node_id, result_dict)
-            events.append(node_event)
+        request = workflow_request_adapter.validate_json(await raw_request.body())
+    except ValidationError as e:
+        # 与FastAPI自动校验的错误格式保持一致，位置以body开头
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
+    
+    request_id = generate_id("req")
+    module_logger.info("[%s] 收到执行工作流请求", request_id)
+    
+    async def event_generator():
+        workflow_id = generate_id("workflow")
+        try:
+            module_logger.info("[%s] 工作流定义:\n%s", request_id, request.workflow)
+            yield orjson.dumps({
+                "event": "workflow",
+                "success": True,
+                "data": request.workflow
+            }) + b"\n"
             
-        # 生成完成事件
-        complete_event = await create_complete_event()
-        events.append(complete_event)
-        
-        module_logger.info(f"[{request_id}] 工作流执行完成")
-        return ApiResponse(
-            event="workflow_execution",
-            success=True,
-            data={
-                "workflow": workflow_event["data"],
-                "events": [event["data"] for event in events]
-            }
-        )
-    except Exception as e:
-        error_msg = f"执行工作流失败: {str(e)}"
-        module_logger.error(f"[{request_id}] {error_msg}", exc_info=True)
-        return ApiResponse(
-            event="workflow_execution",
-            success=False,
-            error=error_msg
-        )
+            # 使用流式执行工作流，节点结果逐行输出
+            async for node_id, result in engine.execute_workflow_stream(
+                request.workflow,
+                workflow_id,
+                request.global_params or {}
+            ):
+                yield orjson.dumps({
+                    "event": "node_result",
+                    "success": True,
+                    "data": convert_node_result(node_id, result)
+                }) + b"\n"
+            
+            module_logger.info("[%s] 工作流执行完成", request_id)
+            yield orjson.dumps({
+                "event": "complete",
+                "success": True,
+                "data": "执行完成"
+            }) + b"\n"
+        except Exception as e:
+            error_msg = f"执行工作流失败: {str(e)}"
+            module_logger.error("[%s] %s", request_id, error_msg, exc_info=True)
+            yield orjson.dumps({
+                "event": "error",
+                "success": False,
+                "error": error_msg
+            }) + b"\n"
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        app,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop" if uvloop else "asyncio"
+    )
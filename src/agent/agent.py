@@ -1,12 +1,15 @@
-from typing import List, Dict, Any, Optional, Union, Callable, TypeVar, Generic
+from typing import List, Dict, Any, Optional, Union, Callable, Awaitable, TypeVar, Generic, Hashable
 from dataclasses import dataclass, field
+from collections import Counter, OrderedDict
 import asyncio
 import logging
 import time
-import hashlib
-import json
+from time import perf_counter as _perf_counter
+import orjson
+import zlib
 from string import Template
-from functools import wraps, lru_cache
+from functools import wraps
+import numpy as np
 from src.api.llm_api import call_llm_api
 from src.api.events import (
     create_action_start_event,
@@ -24,51 +27,120 @@ logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+# 语义缓存向量维度
+EMBEDDING_DIM = 256
+
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """把文本编码为哈希n-gram向量，用于语义缓存的近似匹配
+
+    取字符二元和三元组，经crc32哈希到dim维并带符号累加(特征哈希)，
+    对中文等无空格分词的文本也适用，只在标点、大小写、空白或个别字上不同的问题向量仍然相近。
+
+    Args:
+        text: 输入文本
+        dim: 向量维度
+
+    Returns:
+        np.ndarray: 未归一化的float32向量
+    """
+    text = " ".join(text.lower().split())
+    hashes = [
+        zlib.crc32(text[i : i + n].encode())
+        for n in (2, 3)
+        for i in range(len(text) - n + 1)
+    ]
+    if not hashes:
+        return np.zeros(dim, dtype=np.float32)
+    hashes = np.asarray(hashes, dtype=np.uint32)
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+    return np.bincount(hashes % dim, weights=signs, minlength=dim).astype(np.float32)
+
 
 class Cache(Generic[T]):
-    """改进的LRU缓存实现，带有TTL和分层缓存支持"""
+    """改进的LRU缓存实现，带有TTL和分层缓存支持
+
+    语义缓存把归一化后的向量存放在连续的矩阵中，查询时一次矩阵向量乘法
+    得到与所有缓存项的余弦相似度；写入位置按环形缓冲区轮转，淘汰为O(1)。
+    """
 
-    def __init__(self, maxsize: int = 100, ttl: int = 3600):
-        self.cache: Dict[str, tuple[T, float]] = {}
+    def __init__(
+        self,
+        maxsize: int = 100,
+        ttl: int = 3600,
+        dim: int = EMBEDDING_DIM,
+        similarity_threshold: float = 0.98,
+    ):
+        self.cache: OrderedDict[Hashable, tuple[T, float]] = OrderedDict()
         self.maxsize = maxsize
         self.ttl = ttl
-        self.semantic_cache: Dict[str, tuple[T, float]] = {}  # 语义缓存
-
-    def get(self, key: str, semantic_key: Optional[str] = None) -> Optional[T]:
-        """获取缓存值，支持精确匹配和语义匹配"""
+        self.similarity_threshold = similarity_threshold
+        # 语义缓存：第i行向量对应_semantic_entries[i]
+        self._matrix = np.zeros((maxsize, dim), dtype=np.float32)
+        self._semantic_entries: List[Optional[tuple[T, float]]] = [None] * maxsize
+        self._next_idx = 0
+        self._count = 0
+
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> Optional[np.ndarray]:
+        """L2归一化，零向量返回None"""
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else None
+
+    def get(
+        self, key: Optional[Hashable], semantic_vec: Optional[np.ndarray] = None
+    ) -> Optional[T]:
+        """获取缓存值，支持精确匹配和语义匹配，key为None时只做语义匹配"""
         # 首先尝试精确匹配
-        if key in self.cache:
+        if key is not None and key in self.cache:
             value, timestamp = self.cache[key]
             if time.time() - timestamp <= self.ttl:
+                self.cache.move_to_end(key)
                 return value
             del self.cache[key]
 
-        # 如果提供了语义键，尝试语义匹配
-        if semantic_key and semantic_key in self.semantic_cache:
-            value, timestamp = self.semantic_cache[semantic_key]
-            if time.time() - timestamp <= self.ttl:
-                return value
-            del self.semantic_cache[semantic_key]
+        # 如果提供了语义向量，取相似度最高的缓存项
+        if semantic_vec is not None and self._count:
+            query_vec = self._normalize(semantic_vec)
+            if query_vec is None:
+                return None
+            scores = self._matrix[: self._count] @ query_vec
+            idx = int(scores.argmax())
+            entry = self._semantic_entries[idx]
+            if entry and scores[idx] >= self.similarity_threshold:
+                value, timestamp = entry
+                if time.time() - timestamp <= self.ttl:
+                    return value
+                # 过期项清零，之后不会再被匹配
+                self._matrix[idx] = 0
+                self._semantic_entries[idx] = None
         return None
 
-    def set(self, key: str, value: T, semantic_key: Optional[str] = None) -> None:
-        """设置缓存值，支持精确缓存和语义缓存"""
+    def set(
+        self, key: Optional[Hashable], value: T, semantic_vec: Optional[np.ndarray] = None
+    ) -> None:
+        """设置缓存值，支持精确缓存和语义缓存，key为None时只写入语义缓存"""
         current_time = time.time()
 
-        # 更新精确缓存
-        if len(self.cache) >= self.maxsize:
-            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k][1])
-            del self.cache[oldest_key]
-        self.cache[key] = (value, current_time)
-
-        # 如果提供了语义键，更新语义缓存
-        if semantic_key:
-            if len(self.semantic_cache) >= self.maxsize:
-                oldest_key = min(
-                    self.semantic_cache.keys(), key=lambda k: self.semantic_cache[k][1]
-                )
-                del self.semantic_cache[oldest_key]
-            self.semantic_cache[semantic_key] = (value, current_time)
+        # 更新精确缓存，已满时淘汰最久未使用的项
+        if key is not None:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            elif len(self.cache) >= self.maxsize:
+                self.cache.popitem(last=False)
+            self.cache[key] = (value, current_time)
+
+        # 如果提供了语义向量，写入环形缓冲区的下一个位置，覆盖最早的缓存项
+        if semantic_vec is not None:
+            vec = self._normalize(semantic_vec)
+            if vec is None:
+                return
+            idx = self._next_idx
+            self._matrix[idx] = vec
+            self._semantic_entries[idx] = (value, current_time)
+            self._next_idx = (idx + 1) % self.maxsize
+            self._count = min(self._count + 1, self.maxsize)
 
 
 class Metrics:
@@ -79,7 +151,7 @@ class Metrics:
         self.total_time = 0.0
         self.error_count = 0
         self.last_response_time = 0.0
-        self.tool_usage: Dict[str, int] = {}
+        self.tool_usage: Counter[str] = Counter()
         self.cache_hits = 0
         self.cache_misses = 0
         self.retry_count = 0
@@ -93,7 +165,7 @@ class Metrics:
             self.error_count += 1
 
     def record_tool_usage(self, tool_name: str):
-        self.tool_usage[tool_name] = self.tool_usage.get(tool_name, 0) + 1
+        self.tool_usage[tool_name] += 1
 
     def record_cache_access(self, hit: bool, semantic: bool = False):
         if hit:
@@ -129,14 +201,14 @@ class Metrics:
 def log_execution_time(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        start_time = asyncio.get_event_loop().time()
+        start_time = _perf_counter()
         try:
             result = await func(*args, **kwargs)
-            execution_time = asyncio.get_event_loop().time() - start_time
+            execution_time = _perf_counter() - start_time
             logger.debug(f"{func.__name__} executed in {execution_time:.2f} seconds")
             return result
         except Exception as e:
-            execution_time = asyncio.get_event_loop().time() - start_time
+            execution_time = _perf_counter() - start_time
             logger.error(
                 f"{func.__name__} failed after {execution_time:.2f} seconds: {str(e)}"
             )
@@ -145,6 +217,41 @@ def log_execution_time(func):
     return wrapper
 
 
+class CompiledTemplate:
+    """预先切分的提示模板
+
+    初始化时用string.Template的占位符规则把模板切分为字面量片段和占位符，
+    渲染时只替换占位符所在的片段再一次str.join拼接，
+    效果与safe_substitute相同，但不必每次都用正则扫描整个模板。
+    模板中含有JSON示例的花括号，因此不能改用str.format。
+    """
+
+    def __init__(self, template: str):
+        self._chunks: List[str] = []
+        self._slots: List[tuple[int, str]] = []
+        pos = 0
+        for match in Template.pattern.finditer(template):
+            self._chunks.append(template[pos : match.start()])
+            name = match.group("named") or match.group("braced")
+            if name:
+                self._slots.append((len(self._chunks), name))
+                self._chunks.append(match.group())
+            elif match.group("escaped") is not None:
+                self._chunks.append(Template.delimiter)
+            else:
+                self._chunks.append(match.group())
+            pos = match.end()
+        self._chunks.append(template[pos:])
+
+    def safe_substitute(self, values: Dict[str, Any]) -> str:
+        """替换占位符，未提供的占位符保持原样"""
+        parts = self._chunks.copy()
+        for idx, name in self._slots:
+            if name in values:
+                parts[idx] = str(values[name])
+        return "".join(parts)
+
+
 class AgentError(Exception):
     """Agent相关错误的基类"""
 
@@ -169,7 +276,7 @@ class LLMAPIError(AgentError):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Tool:
     name: str
     description: str
@@ -179,12 +286,26 @@ class Tool:
     outputs: Dict[str, str] = field(default_factory=dict)
     max_retries: int = 0  # 新增：最大重试次数
     retry_delay: float = 1.0  # 新增：重试延迟（秒）
+    # 统一的异步调用入口，构造时按is_async选定
+    _invoke: Callable[[Any], Awaitable[Any]] = field(
+        init=False, repr=False, compare=False
+    )
 
     def __post_init__(self):
         if not callable(self.run):
             raise AgentError(f"Tool {self.name} 'run' must be callable")
         if self.params:
             self._validate_params()
+        if self.is_async:
+            self._invoke = self.run
+        else:
+            # 同步工具仍在当前线程中直接调用，只包装为统一的异步入口
+            run = self.run
+
+            async def _invoke(action_input: Any) -> Any:
+                return run(action_input)
+
+            self._invoke = _invoke
 
     def _validate_params(self) -> None:
         for param_name, param_info in self.params.items():
@@ -206,6 +327,9 @@ class Agent:
         cache_size: int = 100,
         cache_ttl: int = 3600,
         stream_manager=None,
+        response_cache: Optional[Cache[str]] = None,
+        max_parallel_tools: int = 4,
+        semantic_cache: bool = False,
     ):
         if not tools:
             raise AgentError("At least one tool must be provided")
@@ -215,9 +339,21 @@ class Agent:
         self.timeout = timeout
         self.max_iterations = max_iterations
         self.memory_size = memory_size
+        self.max_parallel_tools = max_parallel_tools
+        # 语义缓存按n-gram相似度匹配，只差一个取值的问题也可能命中，默认关闭
+        self.semantic_cache = semantic_cache
         self._validate_tools()
 
-        self._response_cache = Cache[str](maxsize=cache_size, ttl=cache_ttl)
+        # 工具列表在构造后不再变化，工具描述和提示模板只生成一次
+        self._tools_desc_str, self._tool_names_str = self._build_tools_description()
+        self._prompt_template = CompiledTemplate(COT_COMPLETION_PROMPT_TEMPLATES)
+
+        # 语义缓存，可传入共享缓存使多个Agent实例之间复用最终答案，未开启时不创建
+        self._response_cache = (
+            response_cache or Cache[str](maxsize=cache_size, ttl=cache_ttl)
+            if semantic_cache
+            else None
+        )
         self.metrics = Metrics()
         self.stream_manager = stream_manager
     def _validate_tools(self) -> None:
@@ -231,67 +367,102 @@ class Agent:
                 raise AgentError(f"Duplicate tool name found: {tool_name}")
             seen_names.add(tool_name)
 
-    def _construct_prompt(self, query: str, agent_scratchpad: str) -> str:
-        """构造提示模板，使用缓存优化工具描述生成"""
-
-        @lru_cache(maxsize=1)  # 只缓存最新的工具描述，因为工具列表不经常变化
-        def get_tools_description() -> tuple[str, str]:
-            """获取工具描述和工具名称列表，只包含name、description、params和outputs字段"""
-            tool_names = ", ".join(self.tools.keys())
-            tools_desc = []
-
-            for tool in self.tools.values():
-                # 基本描述
-                desc_parts = [f"- {tool.name}: {tool.description}"]
-
-                # 参数信息
-                if tool.params:
-                    desc_parts.append("     Parameters:")
-                    for param_name, param_info in tool.params.items():
-                        param_type = param_info.get("type", "unknown")
-                        param_desc = param_info.get("description", "")
-                        desc_parts.append(
-                            f"        {param_name} ({param_type}): {param_desc}"
-                        )
+    def _build_tools_description(self) -> tuple[str, str]:
+        """生成工具描述和工具名称列表，只包含name、description、params和outputs字段"""
+        tool_names = ", ".join(self.tools.keys())
+        tools_desc = []
+
+        for tool in self.tools.values():
+            # 基本描述
+            desc_parts = [f"- {tool.name}: {tool.description}"]
+
+            # 参数信息
+            if tool.params:
+                desc_parts.append("     Parameters:")
+                for param_name, param_info in tool.params.items():
+                    param_type = param_info.get("type", "unknown")
+                    param_desc = param_info.get("description", "")
+                    desc_parts.append(
+                        f"        {param_name} ({param_type}): {param_desc}"
+                    )
 
-                # 输出信息
-                if tool.outputs:
-                    desc_parts.append("     Outputs:")
-                    for name, desc in tool.outputs.items():
-                        desc_parts.append(f"        {name}: {desc}")
+            # 输出信息
+            if tool.outputs:
+                desc_parts.append("     Outputs:")
+                for name, desc in tool.outputs.items():
+                    desc_parts.append(f"        {name}: {desc}")
 
-                tools_desc.append("\n".join(desc_parts))
+            tools_desc.append("\n".join(desc_parts))
 
-            return "\n".join(tools_desc), tool_names
+        return "\n".join(tools_desc), tool_names
 
-        tools_list, tool_names = get_tools_description()
+    def _construct_prompt(self, query: str, agent_scratchpad: str) -> str:
+        """构造提示模板，工具描述和模板在初始化时已生成"""
         values = {
             "instruction": self.instruction,
-            "tools": tools_list,
-            "tool_names": tool_names,
+            "tools": self._tools_desc_str,
+            "tool_names": self._tool_names_str,
             "query": query,
             "agent_scratchpad": agent_scratchpad
         }
-        agent_prompt = Template(COT_COMPLETION_PROMPT_TEMPLATES).safe_substitute(values)
+        agent_prompt = self._prompt_template.safe_substitute(values)
         return agent_prompt
 
-    async def _call_model(self, prompt: str, chat_id: str) -> str:
-        start_time = time.time()
+    async def _call_model(
+        self, prompt: str, chat_id: str, semantic_text: Optional[str] = None
+    ) -> str:
+        """调用模型，开启语义缓存时先按semantic_text的向量查语义缓存
+
+        完全相同的请求已由call_llm_api的LLMCache缓存，这里不再重复做精确缓存；
+        语义匹配是近似的，只有最终答案才写入语义缓存，不会重放缓存响应中的工具调用
+
+        Args:
+            prompt: 完整提示词
+            chat_id: 聊天会话ID
+            semantic_text: 用于语义匹配的文本，为None时不查语义缓存
+        """
+        start_time = _perf_counter()
+        semantic_vec = (
+            embed_text(semantic_text)
+            if self.semantic_cache and semantic_text
+            else None
+        )
+        if semantic_vec is not None:
+            cached = self._response_cache.get(None, semantic_vec)
+            if cached is not None:
+                self.metrics.record_cache_access(hit=True, semantic=True)
+                return cached
+            self.metrics.record_cache_access(hit=False)
         try:
             messages = [{"role": "user", "content": prompt}]
             response = await call_llm_api(messages)
+            if semantic_vec is not None and self._is_final_answer(response):
+                self._response_cache.set(None, response, semantic_vec)
+            self.metrics.record_call(_perf_counter() - start_time)
             return response
         except Exception as e:
-            execution_time = time.time() - start_time
+            execution_time = _perf_counter() - start_time
             self.metrics.record_call(execution_time, is_error=True)
             raise LLMAPIError(f"LLM API call failed: {str(e)}")
 
+    def _is_final_answer(self, response_text: str) -> bool:
+        """判断模型响应是否为最终答案而不是工具调用"""
+        action = self._parse_action(response_text).get("Action")
+        return isinstance(action, dict) and action.get("action") == "Final Answer"
+
     def _parse_action(self, response_text: str) -> Dict[str, Any]:
         """解析LLM响应为动作字典."""
         try:
-            if "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0]
-            return json.loads(response_text)
+            # 按下标截取第一个代码块，不必把整个响应拆分成列表
+            start = response_text.find("```")
+            if start != -1:
+                end = response_text.find("```", start + 3)
+                response_text = (
+                    response_text[start + 3 : end]
+                    if end != -1
+                    else response_text[start + 3 :]
+                )
+            return orjson.loads(response_text)
         except Exception as e:
             logger.error(f"Failed to parse action from response: {response_text}")
             return {
@@ -300,6 +471,114 @@ class Agent:
                 "Observation": response_text,
             }
 
+    async def _run_tool(
+        self,
+        tool: Tool,
+        action_input: Any,
+        pending: Optional[List[bytes]],
+        flush_events: Callable[[], Awaitable[None]],
+    ) -> Any:
+        """执行工具，失败时按工具的max_retries重试
+
+        Args:
+            tool: 要执行的工具
+            action_input: 工具参数
+            pending: 待发送的事件缓冲区，为None时不生成事件
+            flush_events: 发送缓冲区事件的回调，在等待工具或重试前调用
+
+        Returns:
+            Any: 工具返回的观察结果
+        """
+        action = tool.name
+        retry_count = 0
+        while True:
+            try:
+                # 发送工具进度事件
+                if pending is not None:
+                    pending.append(
+                        create_tool_progress_event(action, "running", action_input)
+                    )
+
+                # 执行工具
+                await flush_events()
+                observation = await tool._invoke(action_input)
+
+                self.metrics.record_tool_usage(action)
+
+                # 发送动作完成事件
+                if pending is not None:
+                    pending.append(create_action_complete_event(action, observation))
+
+                return observation
+
+            except Exception as e:
+                retry_count += 1
+                self.metrics.record_retry()
+                error_msg = str(e)
+
+                # 发送工具重试事件
+                if pending is not None:
+                    pending.append(
+                        create_tool_retry_event(
+                            action, retry_count, tool.max_retries, error_msg
+                        )
+                    )
+
+                if retry_count > tool.max_retries:
+                    raise ToolExecutionError(
+                        f"Tool {action} failed after {retry_count} retries: {error_msg}"
+                    )
+
+                await flush_events()
+                await asyncio.sleep(tool.retry_delay)
+
+    async def _run_parallel_actions(
+        self,
+        actions: List[Dict[str, Any]],
+        pending: Optional[List[bytes]],
+        flush_events: Callable[[], Awaitable[None]],
+    ) -> List[Dict[str, Any]]:
+        """并行执行多个互不依赖的工具调用，并发数不超过max_parallel_tools
+
+        单个工具失败不影响其他工具，错误信息作为该工具的观察结果返回给模型。
+
+        Args:
+            actions: 动作列表，每项包含action和action_input
+            pending: 待发送的事件缓冲区，为None时不生成事件
+            flush_events: 发送缓冲区事件的回调
+
+        Returns:
+            List[Dict[str, Any]]: 与actions一一对应的工具名称和观察结果
+        """
+        calls = []
+        for action_item in actions:
+            action = action_item.get("action", "")
+            if action not in self.tools:
+                raise ToolNotFoundError(f"Invalid action: {action}")
+            action_input = action_item.get("action_input", "")
+            calls.append((self.tools[action], action_input))
+            # 发送动作开始事件
+            if pending is not None:
+                pending.append(create_action_start_event(action, action_input))
+
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+
+        async def run_limited(tool: Tool, action_input: Any) -> Any:
+            async with semaphore:
+                return await self._run_tool(tool, action_input, pending, flush_events)
+
+        results = await asyncio.gather(
+            *(run_limited(tool, action_input) for tool, action_input in calls),
+            return_exceptions=True,
+        )
+        return [
+            {
+                "action": tool.name,
+                "observation": f"Error: {result}" if isinstance(result, Exception) else result,
+            }
+            for (tool, _), result in zip(calls, results)
+        ]
+
     @log_execution_time
     async def run(self, query: str, chat_id: str, stream: bool = True) -> str:
         """执行Agent的主要逻辑
@@ -312,136 +591,136 @@ class Agent:
         Returns:
             str: Agent的响应结果
         """
+        # 循环中频繁访问的属性绑定到局部变量，未启用流式传输时stream_manager为None
+        stream_manager = self.stream_manager if stream else None
+        tools = self.tools
+
+        # 事件先写入缓冲区，在等待模型或工具之前以及结束时批量发送
+        pending: List[bytes] = []
+
+        # 传给工具执行方法的事件缓冲区，未启用流式传输时为None，不构造任何事件
+        tool_events = pending if stream_manager else None
+
+        # 并行执行的工具会同时刷新缓冲区，加锁保证事件按顺序且只发送一次
+        flush_lock = asyncio.Lock()
+
+        async def flush_events() -> None:
+            if not pending:
+                return
+            async with flush_lock:
+                # 先取出当前事件再发送，发送等待期间新追加的事件留给下一次刷新
+                batch = pending[:]
+                pending.clear()
+                if batch:
+                    await stream_manager.send_messages(chat_id, batch)
+
         try:
             # 发送agent开始事件
-            if stream and self.stream_manager:
-                event = await create_agent_start_event(query)
-                await self.stream_manager.send_message(chat_id, event)
+            if stream_manager:
+                pending.append(create_agent_start_event(query))
 
-            agent_scratchpad = ""
+            # 每轮的思考、动作和观察追加到列表，构造提示词时再拼接，避免字符串反复复制
+            agent_scratchpad: List[str] = []
             iteration_count = 0
             final_answer = None
 
             while iteration_count < self.max_iterations:
                 iteration_count += 1
                 try:
-                    prompt = self._construct_prompt(query, agent_scratchpad)
+                    await flush_events()
+                    prompt = self._construct_prompt(query, "".join(agent_scratchpad))
                     logger.info(f"Prompt for iteration {iteration_count}: \n{prompt}")
 
+                    # 只有首轮(还没有工具观察结果)的提示词完全由问题决定，才参与语义匹配
                     model_response = await asyncio.wait_for(
-                        self._call_model(prompt, chat_id), timeout=self.timeout
+                        self._call_model(
+                            prompt,
+                            chat_id,
+                            semantic_text=None if agent_scratchpad else query,
+                        ),
+                        timeout=self.timeout,
                     )
                     logger.info(f"LLM Response: \n{model_response}")
 
                     result_dict = self._parse_action(model_response)
                     action_dict = result_dict.get("Action", {})
-                    action = action_dict.get("action", "")
-                    action_input = action_dict.get("action_input", "")
                     thought = result_dict.get("Thought", {})
                     observation = result_dict.get("Observation", "")
                     
                     # 发送agent思考事件
-                    if stream and self.stream_manager:
-                        event = await create_agent_thinking_event(
+                    if stream_manager:
+                        pending.append(create_agent_thinking_event(
                             f"{thought}"
+                        ))
+
+                    # 数组形式的Action为互不依赖的多个工具调用，并行执行
+                    if isinstance(action_dict, list):
+                        observation = await self._run_parallel_actions(
+                            action_dict,
+                            tool_events,
+                            flush_events,
                         )
-                        await self.stream_manager.send_message(chat_id, event)
-
-                    if action == "Final Answer":
-                        final_answer = action_input
-                        break
-
-                    if not action or action not in self.tools:
-                        raise ToolNotFoundError(f"Invalid action: {action}")
-
-                    tool = self.tools[action]
-
-                    # 发送动作开始事件
-                    if stream and self.stream_manager:
-                        event = await create_action_start_event(action, action_input)
-                        await self.stream_manager.send_message(chat_id, event)
-
-                    retry_count = 0
-                    while retry_count <= tool.max_retries:
-                        try:
-                            # 发送工具进度事件
-                            if stream and self.stream_manager:
-                                event = await create_tool_progress_event(
-                                    action, "running", action_input
-                                )
-                                await self.stream_manager.send_message(chat_id, event)
-
-                            # 执行工具
-                            if tool.is_async:
-                                observation = await tool.run(action_input)
-                            else:
-                                observation = tool.run(action_input)
-
-                            self.metrics.record_tool_usage(action)
-
-                            # 发送动作完成事件
-                            if stream and self.stream_manager:
-                                event = await create_action_complete_event(
-                                    action, observation
-                                )
-                                await self.stream_manager.send_message(chat_id, event)
-
-                            break  # 工具执行成功，退出重试循环
-
-                        except Exception as e:
-                            retry_count += 1
-                            self.metrics.record_retry()
-                            error_msg = str(e)
-
-                            # 发送工具重试事件
-                            if stream and self.stream_manager:
-                                event = await create_tool_retry_event(
-                                    action, retry_count, tool.max_retries, error_msg
-                                )
-                                await self.stream_manager.send_message(chat_id, event)
-
-                            if retry_count > tool.max_retries:
-                                raise ToolExecutionError(
-                                    f"Tool {action} failed after {retry_count} retries: {error_msg}"
-                                )
-
-                            await asyncio.sleep(tool.retry_delay)
-
-                    agent_scratchpad += f"Thought:{thought}\nAction:\n{action_dict}\nObservation:{observation}\n"
+                    else:
+                        action = action_dict.get("action", "")
+                        action_input = action_dict.get("action_input", "")
+
+                        if action == "Final Answer":
+                            final_answer = action_input
+                            break
+
+                        if not action or action not in tools:
+                            raise ToolNotFoundError(f"Invalid action: {action}")
+
+                        tool = tools[action]
+
+                        # 发送动作开始事件
+                        if stream_manager:
+                            pending.append(create_action_start_event(action, action_input))
+
+                        observation = await self._run_tool(
+                            tool,
+                            action_input,
+                            tool_events,
+                            flush_events,
+                        )
+
+                    agent_scratchpad.append(
+                        f"Thought:{thought}\nAction:\n{action_dict}\nObservation:{observation}\n"
+                    )
 
                 except asyncio.TimeoutError:
                     error_msg = f"Model response timeout after {self.timeout} seconds"
-                    if stream and self.stream_manager:
-                        event = await create_agent_error_event(error_msg)
-                        await self.stream_manager.send_message(chat_id, event)
+                    if stream_manager:
+                        pending.append(create_agent_error_event(error_msg))
+                        await flush_events()
                     raise LLMAPIError(error_msg)
 
                 except Exception as e:
                     error_msg = str(e)
-                    if stream and self.stream_manager:
-                        event = await create_agent_error_event(error_msg)
-                        await self.stream_manager.send_message(chat_id, event)
+                    if stream_manager:
+                        pending.append(create_agent_error_event(error_msg))
+                        await flush_events()
                     raise
 
             if not final_answer:
                 error_msg = (
                     f"Failed to get final answer after {self.max_iterations} iterations"
                 )
-                if stream and self.stream_manager:
-                    event = await create_agent_error_event(error_msg)
-                    await self.stream_manager.send_message(chat_id, event)
+                if stream_manager:
+                    pending.append(create_agent_error_event(error_msg))
+                    await flush_events()
                 raise AgentError(error_msg)
 
             # 发送agent完成事件
-            if stream and self.stream_manager:
-                event = await create_agent_complete_event(final_answer)
-                await self.stream_manager.send_message(chat_id, event)
+            if stream_manager:
+                pending.append(create_agent_complete_event(final_answer))
+                await flush_events()
 
             return final_answer
 
         except Exception as e:
             error_msg = str(e)
-            if stream and self.stream_manager:
-                event = await create_agent_error_event(error_msg)
-                await self.stream_manager.send_message(chat_id, event)
+            if stream_manager:
+                pending.append(create_agent_error_event(error_msg))
+                await flush_events()
             raise
\ No newline at end of file
@@ -8,7 +8,7 @@ ${tools}
 
 使用JSON格式返回结构化输出：
 
-每次只输出一个action步骤，必须是以下格式正确的JSON对象：
+每次只输出一个步骤，必须是以下格式正确的JSON对象：
 切记：action_input字段是对象，不是字符串，当value对应的是长str时，注意不能截断，只能用\\n表示，因为长换行字符串不符合json规范
 ```
 {
@@ -21,6 +21,18 @@ ${tools}
 }
 ```
 
+如果需要调用多个互不依赖的工具（例如同时搜索多个关键词），可以把Action写成数组，这些工具会并行执行，Observation为对应的结果数组：
+```
+{
+  "Thought": "分析问题的思考过程",
+  "Action": [
+    {"action": "工具名称", "action_input": "工具参数，json对象"},
+    {"action": "工具名称", "action_input": "工具参数，json对象"}
+  ]
+}
+```
+存在依赖关系的工具必须分多步调用，"Final Answer"不能放在数组中。
+
 如果认为已经有了最终答案，必须以包含以下字段的JSON对象结束：
 ```
 {
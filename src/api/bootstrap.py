@@ -0,0 +1,61 @@
+"""应用启动引导模块"""
+
+import importlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from ..core.engine import WorkflowEngine, NodeResult
+from ..core.node_config import NodeConfigManager
+from ..nodes.registry import NODE_TYPES
+from .utils import convert_node_result
+
+# 配置日志记录
+logger = logging.getLogger(__name__)
+
+def node_status_callback(workflow_id: str, node_id: str, result: NodeResult):
+    """处理节点状态变化的回调函数"""
+    return convert_node_result(node_id, result)
+
+def register_all_nodes(engine: WorkflowEngine, node_manager: NodeConfigManager):
+    """注册所有可用的节点类型
+
+    内置节点直接从静态注册表NODE_TYPES获取；配置中的其他节点类型按type动态导入，
+    这些模块在线程池中并行导入(导入时的磁盘IO会释放GIL)，全部导入完成后再依次注册。
+
+    Args:
+        engine: 工作流引擎
+        node_manager: 节点配置管理器
+    """
+    node_configs = node_manager.node_configs
+
+    # 收集节点类名及配置中定义的type，type即模块名
+    node_classes = []
+    dynamic_entries = []
+    for class_name in node_configs.keys():
+        node_type = node_configs[class_name].get('type')
+        if not node_type:
+            logger.warning("节点 %s 未配置type字段，跳过注册", class_name)
+            continue
+        node_class = NODE_TYPES.get(node_type)
+        if node_class is not None and node_class.__name__ == class_name:
+            node_classes.append((node_type, node_class))
+        else:
+            dynamic_entries.append((class_name, node_type))
+
+    # 并行动态导入注册表之外的节点模块
+    if dynamic_entries:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [
+                executor.submit(importlib.import_module, f"src.nodes.{node_type}")
+                for _, node_type in dynamic_entries
+            ]
+        for (class_name, node_type), future in zip(dynamic_entries, futures):
+            try:
+                node_classes.append((node_type, getattr(future.result(), class_name)))
+            except Exception as e:
+                logger.error("注册节点类型 %s 失败: %s", node_type, e)
+                raise
+
+    for node_type, node_class in node_classes:
+        # 使用配置的type注册节点类型
+        engine.register_node_type(node_type, node_class)
+        node_manager.register_node_type(node_type, node_class)
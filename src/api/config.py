@@ -50,6 +50,18 @@ class APIConfig(BaseModel):
         default=os.getenv("SERPER_API_KEY", ""),
         description="Serper API密钥"
     )
+    llm_cache_size: int = Field(
+        default=int(os.getenv("LLM_CACHE_SIZE", "4096")),
+        description="LLM响应缓存的最大条目数，为0时关闭缓存"
+    )
+    llm_cache_ttl: int = Field(
+        default=int(os.getenv("LLM_CACHE_TTL", "3600")),
+        description="LLM响应缓存的有效期(秒)"
+    )
+    llm_cache_max_temperature: float = Field(
+        default=float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.2")),
+        description="允许缓存响应的最高温度"
+    )
     file_write_path: str = Field(
         default=os.getenv("FILE_WRITE_PATH", "./data/file"),
         description="文件写入节点的默认写入路径"
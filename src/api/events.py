@@ -1,9 +1,12 @@
 """事件生成模块"""
 
-import json
-import time
+import re
+from time import time as _time
 from typing import Any, Dict
 
+from ..core.models import NodeResult
+from .utils import dumps_json
+
 class EventType:
     """事件类型枚举"""
     STATUS = "status"
@@ -24,7 +27,49 @@ class EventType:
     AGENT_ERROR = "agent_error"  # agent执行错误事件
     AGENT_THINKING = "agent_thinking"  # agent思考事件
 
-async def create_event(event_type: str, data: Any) -> Dict:
+# 每种事件类型预先编码好的SSE帧前缀
+_FRAME_PREFIXES: Dict[str, bytes] = {
+    value: b"event: " + value.encode() + b"\ndata: "
+    for name, value in vars(EventType).items()
+    if not name.startswith("_")
+}
+
+def _frame_prefix(event: str) -> bytes:
+    """获取事件帧前缀，未预定义的事件类型临时编码"""
+    prefix = _FRAME_PREFIXES.get(event)
+    if prefix is None:
+        prefix = b"event: " + event.encode() + b"\ndata: "
+    return prefix
+
+# SSE规范允许的换行符，多行文本需要拆分为多个data行
+_LINE_SEP = re.compile(rb"\r\n|\r|\n")
+
+# 完成和错误事件会结束SSE流
+TERMINAL_EVENT_PREFIXES = (b"event: complete\n", b"event: error\n")
+
+def _build_sse_frame(event: str, data: Any) -> bytes:
+    """构建完整的SSE事件帧
+    
+    Args:
+        event: 事件类型
+        data: 事件数据，字符串原样输出，其他类型序列化为JSON
+        
+    Returns:
+        bytes: 可直接写入响应的SSE帧
+    """
+    if isinstance(data, str):
+        payload = data.encode()
+        if b"\n" in payload or b"\r" in payload:
+            payload = b"\ndata: ".join(_LINE_SEP.split(payload))
+    else:
+        payload = dumps_json(data)
+    return _frame_prefix(event) + payload + b"\n\n"
+
+def is_terminal_event(frame: bytes) -> bool:
+    """判断事件帧是否为结束流的完成或错误事件"""
+    return frame.startswith(TERMINAL_EVENT_PREFIXES)
+
+def create_event(event_type: str, data: Any) -> bytes:
     """统一的事件创建函数
     
     Args:
@@ -32,29 +77,19 @@ async def create_event(event_type: str, data: Any) -> Dict:
         data: 事件数据
         
     Returns:
-        Dict: 包含event和data的事件字典
+        bytes: 预先格式化的SSE事件帧
     """
-    # 如果data已经是字符串，不需要额外处理
-    if isinstance(data, str):
-        return {
-            "event": event_type,
-            "data": data
-        }
-    # 如果data是字典或其他类型，转换为JSON字符串
-    return {
-        "event": event_type,
-        "data": json.dumps(data, ensure_ascii=False)
-    }
-
-async def create_status_event(status: str, message: str) -> Dict:
+    return _build_sse_frame(event_type, data)
+
+def create_status_event(status: str, message: str) -> bytes:
     """创建状态事件"""
-    return await create_event(EventType.STATUS, message)
+    return create_event(EventType.STATUS, message)
 
-async def create_workflow_event(workflow: Dict) -> Dict:
+def create_workflow_event(workflow: Dict) -> bytes:
     """创建工作流事件"""
-    return await create_event(EventType.WORKFLOW, workflow)
+    return create_event(EventType.WORKFLOW, workflow)
 
-async def create_result_event(node_id: str, result: Dict[str, Any]) -> Dict:
+def create_result_event(node_id: str, result: Dict[str, Any]) -> bytes:
     """创建节点结果事件
     
     Args:
@@ -62,92 +97,148 @@ async def create_result_event(node_id: str, result: Dict[str, Any]) -> Dict:
         result: 节点执行结果字典，包含success、status、data、error等字段
         
     Returns:
-        Dict: 事件字典
+        bytes: SSE事件帧
     """
     # 确保result是字典类型
     if not isinstance(result, dict):
         raise TypeError("Result must be a dictionary")
         
-    return await create_event(EventType.NODE_RESULT, {
+    return create_event(EventType.NODE_RESULT, {
         **result,
         "node_id": node_id  # 确保node_id存在于结果中
     })
 
-async def create_explanation_event(content: str) -> Dict:
+def create_node_result_event(node_id: str, result: NodeResult) -> bytes:
+    """直接由NodeResult创建节点结果事件
+    
+    一次orjson序列化生成事件帧，无法直接序列化的数据转换为字符串，
+    省去convert_node_result和create_result_event的中间字典。
+    
+    Args:
+        node_id: 节点ID
+        result: 节点执行结果
+        
+    Returns:
+        bytes: SSE事件帧
+    """
+    payload = dumps_json({
+        "node_id": node_id,
+        "success": result.success,
+        "status": result.status.value,
+        "data": result.data if result.success else None,
+        "error": str(result.error) if result.error else None
+    }, default=str)
+    return _FRAME_PREFIXES[EventType.NODE_RESULT] + payload + b"\n\n"
+
+def create_explanation_event(content: str) -> bytes:
     """创建解释说明事件"""
-    return await create_event(EventType.EXPLANATION, content)
+    return create_event(EventType.EXPLANATION, content)
 
-async def create_answer_event(content: str) -> Dict:
+def create_answer_event(content: str) -> bytes:
     """创建回答事件"""
-    return await create_event(EventType.ANSWER, content)
+    return create_event(EventType.ANSWER, content)
+
+# 流式回答和解释事件中增量内容之前的固定部分
+_ANSWER_CHUNK_PREFIX = _FRAME_PREFIXES[EventType.ANSWER] + b'{"event":"answer","success":true,"data":'
+_EXPLANATION_CHUNK_PREFIX = (
+    _FRAME_PREFIXES[EventType.EXPLANATION] + b'{"event":"explanation","success":true,"data":'
+)
+
+def create_answer_chunk_event(content_json: bytes) -> bytes:
+    """由JSON字符串字面量直接拼接流式回答事件
+    
+    与create_answer_event({"event": "answer", "success": True, "data": chunk})
+    生成的帧格式相同，增量内容不再经过解码和重新序列化
+    
+    Args:
+        content_json: 带引号且已转义的JSON字符串字节
+        
+    Returns:
+        bytes: SSE事件帧
+    """
+    return _ANSWER_CHUNK_PREFIX + content_json + b"}\n\n"
+
+def create_explanation_chunk_event(content_json: bytes) -> bytes:
+    """由JSON字符串字面量直接拼接流式解释事件
+    
+    与create_explanation_event({"event": "explanation", "success": True, "data": chunk})
+    生成的帧格式相同
+    
+    Args:
+        content_json: 带引号且已转义的JSON字符串字节
+        
+    Returns:
+        bytes: SSE事件帧
+    """
+    return _EXPLANATION_CHUNK_PREFIX + content_json + b"}\n\n"
 
-async def create_complete_event() -> Dict:
+def create_complete_event() -> bytes:
     """创建完成事件"""
-    return await create_event(EventType.COMPLETE, "执行完成")
+    return create_event(EventType.COMPLETE, "执行完成")
 
-async def create_error_event(error_message: str) -> Dict:
+def create_error_event(error_message: str) -> bytes:
     """创建错误事件"""
-    return await create_event(EventType.ERROR, error_message)
+    return create_event(EventType.ERROR, error_message)
 
-async def create_action_start_event(action: str, action_input: Any) -> Dict:
+def create_action_start_event(action: str, action_input: Any) -> bytes:
     """创建动作开始事件"""
-    return await create_event(EventType.ACTION_START, {
+    return create_event(EventType.ACTION_START, {
         "action": action,
         "input": action_input,
-        "timestamp": time.time()
+        "timestamp": _time()
     })
 
-async def create_action_complete_event(action: str, result: Any) -> Dict:
+def create_action_complete_event(action: str, result: Any) -> bytes:
     """创建动作完成事件"""
-    return await create_event(EventType.ACTION_COMPLETE, {
+    return create_event(EventType.ACTION_COMPLETE, {
         "action": action,
         "result": result,
-        "timestamp": time.time()
+        "timestamp": _time()
     })
 
-async def create_tool_progress_event(tool: str, status: str, result: Any) -> Dict:
+def create_tool_progress_event(tool: str, status: str, result: Any) -> bytes:
     """创建工具进度事件"""
-    return await create_event(EventType.TOOL_PROGRESS, {
+    return create_event(EventType.TOOL_PROGRESS, {
         "tool": tool,
         "status": status,
         "result": str(result),
-        "timestamp": time.time()
+        "timestamp": _time()
     })
 
-async def create_tool_retry_event(tool: str, attempt: int, max_retries: int, error: str) -> Dict:
+def create_tool_retry_event(tool: str, attempt: int, max_retries: int, error: str) -> bytes:
     """创建工具重试事件"""
-    return await create_event(EventType.TOOL_RETRY, {
+    return create_event(EventType.TOOL_RETRY, {
         "tool": tool,
         "attempt": attempt,
         "max_retries": max_retries,
         "error": error,
-        "timestamp": time.time()
+        "timestamp": _time()
     })
 
-async def create_agent_start_event(query: str) -> Dict:
+def create_agent_start_event(query: str) -> bytes:
     """创建agent开始事件"""
-    return await create_event(EventType.AGENT_START, {
+    return create_event(EventType.AGENT_START, {
         "query": query,
-        "timestamp": time.time()
+        "timestamp": _time()
     })
 
-async def create_agent_complete_event(result: str) -> Dict:
+def create_agent_complete_event(result: str) -> bytes:
     """创建agent完成事件"""
-    return await create_event(EventType.AGENT_COMPLETE, {
+    return create_event(EventType.AGENT_COMPLETE, {
         "result": result,
-        "timestamp": time.time()
+        "timestamp": _time()
     })
 
-async def create_agent_error_event(error: str) -> Dict:
+def create_agent_error_event(error: str) -> bytes:
     """创建agent错误事件"""
-    return await create_event(EventType.AGENT_ERROR, {
+    return create_event(EventType.AGENT_ERROR, {
         "error": error,
-        "timestamp": time.time()
+        "timestamp": _time()
     })
 
-async def create_agent_thinking_event(thought: str) -> Dict:
+def create_agent_thinking_event(thought: str) -> bytes:
     """创建agent思考事件"""
-    return await create_event(EventType.AGENT_THINKING, {
+    return create_event(EventType.AGENT_THINKING, {
         "thought": thought,
-        "timestamp": time.time()
+        "timestamp": _time()
     })
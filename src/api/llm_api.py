@@ -1,16 +1,63 @@
 """LLM API调用模块"""
 
 import logging
-import json
 import asyncio
+import re
 import aiohttp
-from typing import List, Dict, Union, AsyncGenerator, Tuple
+import orjson
+from typing import Any, Callable, List, Dict, Optional, Union, AsyncGenerator, Tuple
 
 from .config import API_CONFIG, retry_on_error
+from .llm_cache import LLMCache
 
 # 配置日志记录
 logger = logging.getLogger(__name__)
 
+# 非流式调用的响应缓存
+llm_cache = LLMCache(
+    maxsize=API_CONFIG["llm_cache_size"],
+    ttl=API_CONFIG["llm_cache_ttl"],
+    max_temperature=API_CONFIG["llm_cache_max_temperature"]
+)
+
+# LLM请求的超时配置，静态不变，模块加载时创建一次
+_CLIENT_TIMEOUT = aiohttp.ClientTimeout(total=60)
+
+# 全局共享的HTTP会话，复用连接池和到LLM服务的keep-alive连接
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """获取共享的aiohttp会话，首次调用时创建
+    
+    Returns:
+        aiohttp.ClientSession: 全局共享的会话
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=32,
+                ttl_dns_cache=300,
+                keepalive_timeout=75
+            ),
+            timeout=_CLIENT_TIMEOUT,
+            # 鉴权和内容类型对所有请求都相同，作为会话默认请求头只构建一次
+            headers={
+                "Authorization": f"Bearer {API_CONFIG['api_key']}",
+                "Content-Type": "application/json"
+            },
+            read_bufsize=2**17  # 128KB buffer size
+        )
+    return _session
+
+async def close_session() -> None:
+    """关闭共享的aiohttp会话，应在应用退出时调用"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
 def calculate_messages_length(messages: List[Dict[str, str]]) -> int:
     """
     计算消息列表的总字符长度
@@ -21,250 +68,431 @@ def calculate_messages_length(messages: List[Dict[str, str]]) -> int:
     Returns:
         总字符长度
     """
-    total_length = 0
-    for message in messages:
-        # 计算每条消息中role和content的长度
-        total_length += len(message.get("role", ""))
-        total_length += len(message.get("content", ""))
-    return total_length
-
-def truncate_messages(messages: List[Dict[str, str]], max_length: int = 100000) -> List[Dict[str, str]]:
+    # 每条消息计入role和content的长度
+    return sum(
+        len(message.get("role", "")) + len(message.get("content", ""))
+        for message in messages
+    )
+
+def truncate_messages(
+    messages: List[Dict[str, str]],
+    max_length: int = 100000,
+    keep_prefix: int = 0
+) -> Tuple[List[Dict[str, str]], int]:
     """
     如果消息总长度超过max_length，则只截断用户消息的content
     
     Args:
         messages: 消息列表
         max_length: 最大允许的总字符长度
+        keep_prefix: 开头不参与截断的消息条数，用于保持可缓存前缀不变
     
     Returns:
-        截断后的消息列表
+        截断后的消息列表及其总字符长度
     """
     if not messages:
-        return messages
+        return messages, 0
         
     # 如果总长度在限制内，直接返回原始消息
     total_length = calculate_messages_length(messages)
     if total_length <= max_length:
-        return messages
+        return messages, total_length
     
     # 计算需要截断的长度
     excess_length = total_length - max_length
     
-    # 获取所有用户消息
-    user_messages = [msg for msg in messages if msg.get("role") == "user" and msg.get("content")]
-    if not user_messages:
-        return messages
-        
-    # 计算每条用户消息需要截断的平均长度
-    truncate_per_message = excess_length // len(user_messages)
-    
-    # 创建新的消息列表，截断content
-    truncated = []
-    remaining_excess = excess_length
-    
-    for msg in messages:
-        if msg.get("role") == "user" and msg.get("content") and remaining_excess > 0:
-            # 只截断用户消息的content
-            content = msg["content"]
-            # 确保至少保留一半的内容
-            content_length = max(len(content) - truncate_per_message, len(content) // 2)
-            truncated.append({
-                **msg,
-                "content": content[:content_length]
-            })
-            remaining_excess -= (len(content) - content_length)
-        else:
-            truncated.append(msg)
+    # 获取所有用户消息的下标和长度
+    user_indexes = [
+        i for i, msg in enumerate(messages)
+        if i >= keep_prefix and msg.get("role") == "user" and msg.get("content")
+    ]
+    if not user_indexes:
+        return messages, total_length
+    user_lengths = [len(messages[i]["content"]) for i in user_indexes]
     
-    logger.info(
-        f"消息长度({total_length})超过{max_length}字符限制，已按比例截断用户消息内容"
-    )
-    return truncated
+    # 所有用户消息按同一比例截断，确保至少保留一半的内容
+    scale = max(0.5, 1 - excess_length / sum(user_lengths))
+    
+    # 只复制实际被截断的消息，其余消息沿用原对象
+    truncated = list(messages)
+    new_length = total_length
+    for i, content_length in zip(user_indexes, user_lengths):
+        keep_length = max(int(content_length * scale), content_length // 2)
+        if keep_length < content_length:
+            msg = messages[i]
+            truncated[i] = {**msg, "content": msg["content"][:keep_length]}
+            new_length -= content_length - keep_length
+    
+    logger.info("消息长度(%d)超过%d字符限制，已按比例截断用户消息内容", total_length, max_length)
+    return truncated, new_length
 
-def select_model(messages: List[Dict[str, str]], request_id: str = None) -> str:
+def select_model(messages_length: int, request_id: str = None) -> str:
     """
     根据消息长度选择合适的模型
     
     Args:
-        messages: 消息列表
+        messages_length: 消息总字符长度
         request_id: 请求ID,用于日志追踪
     
     Returns:
         选择的模型名称
     """
-    messages_length = calculate_messages_length(messages)
-    
     if messages_length > API_CONFIG["context_length_threshold"]:
         logger.info(
-            f"[{request_id}] 消息长度({messages_length})超过阈值"
-            f"({API_CONFIG['context_length_threshold']}), "
-            f"使用长上下文模型: {API_CONFIG['long_context_model']}"
+            "[%s] 消息长度(%d)超过阈值(%d), 使用长上下文模型: %s",
+            request_id,
+            messages_length,
+            API_CONFIG["context_length_threshold"],
+            API_CONFIG["long_context_model"]
         )
         return API_CONFIG["long_context_model"]
     
     return API_CONFIG["model_name"]
 
-async def call_llm_api_stream(messages: List[Dict[str, str]], request_id: str = None) -> AsyncGenerator[str, None]:
+def _prepend_prefix(
+    messages: List[Dict[str, str]],
+    cacheable_prefix: Optional[List[Dict[str, str]]] = None
+) -> Tuple[List[Dict[str, str]], int]:
+    """把可缓存前缀放到消息列表最前面并截断其余消息
+    
+    服务端的前缀缓存按请求开头的内容匹配，前缀保持逐字节不变才能命中，
+    因此前缀消息始终排在最前且不会被截断
+    
+    Args:
+        messages: 消息列表
+        cacheable_prefix: 稳定不变的前缀消息
+    
+    Returns:
+        合并截断后的消息列表及其总字符长度
+    """
+    if not cacheable_prefix:
+        return truncate_messages(messages)
+    return truncate_messages(cacheable_prefix + messages, keep_prefix=len(cacheable_prefix))
+
+# SSE数据行的前缀和结束标记
+_DATA_PREFIX = b'data: '
+_DATA_PREFIX_LEN = len(_DATA_PREFIX)
+_DONE_LINE = b'data: [DONE]'
+_loads = orjson.loads
+
+def _parse_stream_line(line: bytes, request_id: str = None) -> Optional[str]:
+    """解析一行SSE数据，返回其中的增量内容
+    
+    直接在bytes上判断前缀，只把JSON数据交给orjson解析，省去逐行解码为str
+    
+    Args:
+        line: 不含换行符的SSE行
+        request_id: 请求ID,用于日志追踪
+    
+    Returns:
+        增量内容，非数据行或没有内容时返回None
+    """
+    line = line.rstrip(b'\r')
+    if not line.startswith(_DATA_PREFIX) or line == _DONE_LINE:
+        return None
+    try:
+        data = _loads(line[_DATA_PREFIX_LEN:])
+    except orjson.JSONDecodeError as e:
+        logger.error("[%s] 处理流式响应出错: %s", request_id, e)
+        raise
+    choices = data.get('choices')
+    if choices:
+        delta = choices[0].get('delta') or {}
+        return delta.get('content') or None
+    return None
+
+# 从SSE数据行中截取delta.content的JSON字符串字面量(含引号)
+_CONTENT_JSON = re.compile(rb'"content"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+def _extract_content_json(line: bytes, request_id: str = None) -> Optional[bytes]:
+    """截取一行SSE数据中增量内容的JSON字符串字面量
+    
+    直接在原始字节上匹配delta里的content字段，保留服务端的转义结果，
+    匹配不到时(如content为null或格式不同)退回完整的JSON解析
+    
+    Args:
+        line: 不含换行符的SSE行
+        request_id: 请求ID,用于日志追踪
+    
+    Returns:
+        带引号的JSON字符串字节，非数据行或没有内容时返回None
     """
-    调用llm API服务(流式),支持自动重试
+    line = line.rstrip(b'\r')
+    if not line.startswith(_DATA_PREFIX) or line == _DONE_LINE:
+        return None
+    delta_start = line.find(b'"delta"', _DATA_PREFIX_LEN)
+    if delta_start >= 0:
+        match = _CONTENT_JSON.search(line, delta_start)
+        if match is not None:
+            value = match.group(1)
+            # 空字符串 "" 视为没有内容
+            return value if len(value) > 2 else None
+    content = _parse_stream_line(line, request_id)
+    return orjson.dumps(content) if content else None
+
+def call_llm_api_stream(
+    messages: List[Dict[str, str]],
+    request_id: str = None,
+    cacheable_prefix: Optional[List[Dict[str, str]]] = None
+) -> AsyncGenerator[str, None]:
+    """
+    调用llm API服务(流式)
     
     Args:
         messages: 消息列表
         request_id: 请求ID,用于日志追踪
+        cacheable_prefix: 稳定不变的前缀消息(如系统提示词)，放在最前面且不参与截断
     
     Returns:
         异步生成器,生成流式响应内容
     """
+    return _stream_completion(messages, request_id, cacheable_prefix, _parse_stream_line)
+
+def call_llm_api_stream_json(
+    messages: List[Dict[str, str]],
+    request_id: str = None,
+    cacheable_prefix: Optional[List[Dict[str, str]]] = None
+) -> AsyncGenerator[bytes, None]:
+    """
+    调用llm API服务(流式)，以JSON字符串字面量的形式生成增量内容
+    
+    增量内容直接从SSE行中截取，不经过解码再编码，适合原样拼接进下游的JSON事件帧
+    
+    Args:
+        messages: 消息列表
+        request_id: 请求ID,用于日志追踪
+        cacheable_prefix: 稳定不变的前缀消息(如系统提示词)，放在最前面且不参与截断
     
-    logger.info(f"[{request_id}] 开始流式调用llm API")
+    Returns:
+        异步生成器,生成带引号且已转义的JSON字符串字节
+    """
+    return _stream_completion(messages, request_id, cacheable_prefix, _extract_content_json)
 
-    messages = truncate_messages(messages)
+@retry_on_error(max_retries=3)
+async def _open_stream(
+    model: str,
+    messages: List[Dict[str, str]],
+    request_id: str = None
+) -> aiohttp.ClientResponse:
+    """
+    发起流式请求并返回状态正常的响应，建立连接失败时自动重试
+    
+    只重试到拿到响应头为止，已经开始输出内容的流不会重放
+    
+    Args:
+        model: 模型名称
+        messages: 已截断的消息列表
+        request_id: 请求ID,用于日志追踪
+    
+    Returns:
+        aiohttp.ClientResponse: 尚未读取响应体的流式响应，由调用方负责释放
+    """
+    session = await get_session()
+    response = await session.post(
+        f"{API_CONFIG['base_url']}/chat/completions",
+        data=orjson.dumps({"model": model, "messages": messages, "stream": True})
+    )
+    if response.status != 200:
+        try:
+            error_text = await response.text()
+        finally:
+            response.release()
+        if request_id:
+            logger.error("[%s] API调用失败: %s", request_id, error_text)
+        raise ValueError(f"API调用失败: {error_text}")
+    return response
+
+async def _stream_completion(
+    messages: List[Dict[str, str]],
+    request_id: str,
+    cacheable_prefix: Optional[List[Dict[str, str]]],
+    parse_line: Callable[[bytes, Optional[str]], Any]
+) -> AsyncGenerator[Any, None]:
+    """
+    发送流式请求，用parse_line逐行解析SSE数据并生成增量内容
+    
+    Args:
+        messages: 消息列表
+        request_id: 请求ID,用于日志追踪
+        cacheable_prefix: 稳定不变的前缀消息
+        parse_line: SSE行解析函数，返回增量内容，无内容时返回None
+    
+    Returns:
+        异步生成器,生成parse_line解析出的增量内容
+    """
+    logger.info("[%s] 开始流式调用llm API", request_id)
+
+    messages, messages_length = _prepend_prefix(messages, cacheable_prefix)
     
     # 根据消息长度选择模型
-    model = select_model(messages, request_id)
-    messages_length = calculate_messages_length(messages)
+    model = select_model(messages_length, request_id)
     
     logger.info(
-        f"[{request_id}] 请求参数: model={model}, "
-        f"messages_count={len(messages)}, "
-        f"messages_length={messages_length}"
+        "[%s] 请求参数: model=%s, messages_count=%d, messages_length=%d",
+        request_id, model, len(messages), messages_length
     )
         
-    # Configure larger buffer sizes for handling big response chunks
-    conn = aiohttp.TCPConnector()
-    client_timeout = aiohttp.ClientTimeout(total=60)
-    async with aiohttp.ClientSession(
-        connector=conn,
-        timeout=client_timeout,
-        read_bufsize=2**17  # 128KB buffer size
-    ) as session:
-        headers = {
-            "Authorization": f"Bearer {API_CONFIG['api_key']}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model,
-            "messages": messages,
-            "stream": True
-        }
-        
-        try:
-            async with session.post(
-                f"{API_CONFIG['base_url']}/chat/completions",
-                headers=headers,
-                json=data,
-                chunked=True
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    if request_id:
-                        logger.error(f"[{request_id}] API调用失败: {error_text}")
-                    raise ValueError(f"API调用失败: {error_text}")
-                
-                async for line in response.content:
-                    if line:
-                        try:
-                            line = line.decode('utf-8').strip()
-                            if line.startswith('data: ') and line != 'data: [DONE]':
-                                json_str = line[6:]  # 去掉 "data: "
-                                data = json.loads(json_str)
-                                if len(data['choices']) > 0:
-                                    delta = data['choices'][0].get('delta', {})
-                                    if 'content' in delta:
-                                        yield delta['content']
-                        except Exception as e:
-                            if "Chunk too big" in str(e):
-                                logger.warning(f"[{request_id}] 收到大块响应，尝试继续处理")
-                                # Try to process the chunk even if it's large
-                                continue
-                            else:
-                                logger.error(f"[{request_id}] 处理流式响应出错: {str(e)}")
-                                raise
-                
-        except asyncio.TimeoutError:
-            error_msg = "API调用超时"
-            if request_id:
-                logger.error(f"[{request_id}] {error_msg}")
-            raise ValueError(error_msg)
-        except Exception as e:
-            if request_id:
-                logger.error(f"[{request_id}] API调用异常: {str(e)}")
-            raise
+    try:
+        response = await _open_stream(model, messages, request_id)
+        async with response:
+            # 按网络读取到的数据块迭代，在本地缓冲区中按行切分，
+            # 一次读取包含多个SSE行时只需恢复一次协程
+            buffer = bytearray()
+            # 热循环中用到的函数绑定为局部变量，省去逐行的全局和属性查找
+            find = buffer.find
+            startswith = buffer.startswith
+            async for chunk in response.content.iter_any():
+                buffer.extend(chunk)
+                start = 0
+                while True:
+                    end = find(b'\n', start)
+                    if end < 0:
+                        break
+                    line_start = start
+                    start = end + 1
+                    # 只切片解析data行，SSE事件间的空行和注释行直接跳过
+                    if not startswith(_DATA_PREFIX, line_start):
+                        continue
+                    content = parse_line(bytes(buffer[line_start:end]), request_id)
+                    if content:
+                        yield content
+                del buffer[:start]
+            # 处理没有以换行结尾的最后一行
+            if buffer:
+                content = parse_line(bytes(buffer), request_id)
+                if content:
+                    yield content
 
-@retry_on_error(max_retries=3)
-async def call_llm_api(messages: List[Dict[str, str]], request_id: str = None, temperature: float = 0.1) -> str:
+    except asyncio.TimeoutError:
+        error_msg = "API调用超时"
+        if request_id:
+            logger.error("[%s] %s", request_id, error_msg)
+        raise ValueError(error_msg)
+    except Exception as e:
+        if request_id:
+            logger.error("[%s] API调用异常: %s", request_id, e)
+        raise
+
+async def call_llm_api(
+    messages: List[Dict[str, str]],
+    request_id: str = None,
+    temperature: float = 0.1,
+    cacheable_prefix: Optional[List[Dict[str, str]]] = None
+) -> str:
     """
     调用llm API服务，支持自动重试
     
+    消息截断、模型选择和缓存查询只执行一次，重试只针对网络请求
+    
     Args:
         messages: 消息列表
         request_id: 请求ID,用于日志追踪
         temperature: 温度参数，控制输出的随机性，默认0.1
+        cacheable_prefix: 稳定不变的前缀消息(如系统提示词)，放在最前面且不参与截断
     
     Returns:
         返回完整响应字符串
     """
-    logger.info(f"[{request_id}] 开始调用llm API")
+    logger.info("[%s] 开始调用llm API", request_id)
 
-    messages = truncate_messages(messages)
+    messages, messages_length = _prepend_prefix(messages, cacheable_prefix)
     
     # 根据消息长度选择模型
-    model = select_model(messages, request_id)
-    messages_length = calculate_messages_length(messages)
-    
+    model = select_model(messages_length, request_id)
     
     logger.info(
-        f"[{request_id}] 请求参数: model={model}, "
-        f"temperature={temperature}, "
-        f"messages_count={len(messages)}, "
-        f"messages_length={messages_length}"
+        "[%s] 请求参数: model=%s, temperature=%s, messages_count=%d, messages_length=%d",
+        request_id, model, temperature, len(messages), messages_length
     )
-        
-    # Use same optimized session configuration as streaming
-    conn = aiohttp.TCPConnector()
-    client_timeout = aiohttp.ClientTimeout(total=60)
-    async with aiohttp.ClientSession(
-        connector=conn,
-        timeout=client_timeout,
-        read_bufsize=2**17  # 64KB buffer size
-    ) as session:
-        headers = {
-            "Authorization": f"Bearer {API_CONFIG['api_key']}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model,
-            "messages": messages,
-            "stream": False,
-            "temperature": temperature
-        }
-        
-        try:
-            async with session.post(
-                f"{API_CONFIG['base_url']}/chat/completions",
-                headers=headers,
-                json=data,
-                chunked=True
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    if request_id:
-                        logger.error(f"[{request_id}] API调用失败: {error_text}")
-                    raise ValueError(f"API调用失败: {error_text}")
-                
-                result = await response.json()
+
+    # 相同模型、消息和温度的低温度调用直接返回缓存的响应
+    cache_key = llm_cache.cache_key(model, messages, temperature) if llm_cache.maxsize > 0 else None
+    if cache_key is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            logger.info("[%s] 命中LLM响应缓存", request_id)
+            return cached
+
+    content = await _request_completion(model, messages, temperature, request_id)
+    if cache_key is not None:
+        llm_cache.set(cache_key, content)
+    return content
+
+@retry_on_error(max_retries=3)
+async def _request_completion(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    request_id: str = None
+) -> str:
+    """
+    发送非流式请求并返回响应内容，失败时自动重试
+    
+    Args:
+        model: 模型名称
+        messages: 已截断的消息列表
+        temperature: 温度参数
+        request_id: 请求ID,用于日志追踪
+    
+    Returns:
+        返回完整响应字符串
+    """
+    session = await get_session()
+    try:
+        async with session.post(
+            f"{API_CONFIG['base_url']}/chat/completions",
+            data=orjson.dumps({
+                "model": model,
+                "messages": messages,
+                "stream": False,
+                "temperature": temperature
+            })
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
                 if request_id:
-                    logger.info(f"[{request_id}] API调用成功")
-                return result["choices"][0]["message"]["content"]
-                
-        except asyncio.TimeoutError:
-            error_msg = "API调用超时"
-            if request_id:
-                logger.error(f"[{request_id}] {error_msg}")
-            raise ValueError(error_msg)
-        except Exception as e:
+                    logger.error("[%s] API调用失败: %s", request_id, error_text)
+                raise ValueError(f"API调用失败: {error_text}")
+
+            result = orjson.loads(await response.read())
             if request_id:
-                logger.error(f"[{request_id}] API调用异常: {str(e)}")
-            raise
\ No newline at end of file
+                logger.info("[%s] API调用成功", request_id)
+            return result["choices"][0]["message"]["content"]
+
+    except asyncio.TimeoutError:
+        error_msg = "API调用超时"
+        if request_id:
+            logger.error("[%s] %s", request_id, error_msg)
+        raise ValueError(error_msg)
+    except Exception as e:
+        if request_id:
+            logger.error("[%s] API调用异常: %s", request_id, e)
+        raise
+
+async def call_llm_api_batch(
+    batch: List[List[Dict[str, str]]],
+    request_id: str = None,
+    temperature: float = 0.1,
+    max_concurrency: int = 10
+) -> List[str]:
+    """
+    并发调用llm API服务处理多组消息
+    
+    所有请求先全部提交再统一等待，通过共享会话并发发出，用信号量限制同时进行的请求数
+    
+    Args:
+        batch: 多组消息列表，每组对应一次调用
+        request_id: 请求ID,用于日志追踪，每个子请求追加序号
+        temperature: 温度参数，控制输出的随机性，默认0.1
+        max_concurrency: 最大并发请求数
+    
+    Returns:
+        与batch顺序一致的响应字符串列表
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def call_one(messages: List[Dict[str, str]], index: int) -> str:
+        async with semaphore:
+            return await call_llm_api(messages, f"{request_id}-{index}", temperature)
+
+    return await asyncio.gather(*(call_one(messages, i) for i, messages in enumerate(batch)))
@@ -0,0 +1,70 @@
+"""LLM响应缓存模块
+
+对确定性较强(低温度)的非流式调用，按(模型, 消息, 温度)缓存完整响应，
+相同请求直接返回缓存结果，省去网络往返和模型推理。
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+class LLMCache:
+    """带TTL的LRU响应缓存"""
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600, max_temperature: float = 0.2):
+        """
+        Args:
+            maxsize: 最大缓存条目数
+            ttl: 缓存有效期(秒)
+            max_temperature: 允许缓存的最高温度，温度更高的调用输出随机性大，不缓存
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self._entries: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+
+    def cache_key(self, model: str, messages: List[Dict[str, Any]], temperature: float) -> Optional[bytes]:
+        """计算缓存键
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            temperature: 温度参数
+
+        Returns:
+            Optional[bytes]: 缓存键，温度超过阈值时返回None表示不缓存
+        """
+        if temperature > self.max_temperature:
+            return None
+        payload = orjson.dumps(
+            {"model": model, "messages": messages, "temperature": temperature},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        """获取未过期的缓存响应"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: bytes, value: str) -> None:
+        """写入缓存，已满时淘汰最久未使用的条目"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self.maxsize:
+            self._entries.popitem(last=False)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
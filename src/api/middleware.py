@@ -0,0 +1,27 @@
+"""HTTP中间件模块"""
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+class SSEAwareGZipMiddleware(GZipMiddleware):
+    """跳过SSE流的GZip压缩中间件
+
+    GZip压缩会缓冲输出直到凑满压缩块，SSE事件因此无法实时到达客户端，
+    所以流式路径直接交给下游应用处理，其他响应照常压缩。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        compresslevel: int = 9,
+        excluded_prefixes: tuple = ("/stream/",)
+    ) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.excluded_prefixes = excluded_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith(self.excluded_prefixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
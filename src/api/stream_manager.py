@@ -1,17 +1,28 @@
 """流式响应管理模块"""
 
 import asyncio
-from typing import Dict, Optional, AsyncGenerator
+from typing import Dict, List, Optional, AsyncGenerator
 from datetime import datetime
 import logging
 
+from .events import is_terminal_event
+
 logger = logging.getLogger(__name__)
 
 class StreamManager:
     """流式响应管理器"""
     
-    def __init__(self):
+    def __init__(self, max_queue_size: int = 256, put_timeout: float = 60.0):
+        """
+        Args:
+            max_queue_size: 每个流的队列容量，客户端读取过慢时对生产者形成背压
+            put_timeout: 队列已满时最长等待客户端消费的秒数，超时视为客户端已离开并关闭流
+        """
         self._streams: Dict[str, asyncio.Queue] = {}
+        # 每个流的关闭标记，流关闭后等待入队的生产者立即放弃，不会永久阻塞
+        self._closed: Dict[str, asyncio.Event] = {}
+        self._max_queue_size = max_queue_size
+        self._put_timeout = put_timeout
         
     def create_stream(self, chat_id: str) -> str:
         """创建新的流式响应队列
@@ -23,27 +34,107 @@ class StreamManager:
             str: 返回chat_id
         """
         if chat_id not in self._streams:
-            self._streams[chat_id] = asyncio.Queue()
+            self._streams[chat_id] = asyncio.Queue(maxsize=self._max_queue_size)
+            self._closed[chat_id] = asyncio.Event()
         return chat_id
+
+    async def _put(self, chat_id: str, queue: asyncio.Queue, message: bytes) -> bool:
+        """消息入队，队列已满时等待空位，直到流被关闭或等待超时
         
-    async def send_message(self, chat_id: str, message: dict) -> None:
+        Args:
+            chat_id: 聊天会话ID
+            queue: 流的消息队列
+            message: 要入队的消息
+            
+        Returns:
+            bool: 消息是否已入队，流已关闭时返回False
+        """
+        closed = self._closed.get(chat_id)
+        if closed is None or closed.is_set():
+            return False
+        try:
+            queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        put_task = asyncio.ensure_future(queue.put(message))
+        closed_task = asyncio.ensure_future(closed.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {put_task, closed_task},
+                timeout=self._put_timeout,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            closed_task.cancel()
+            if not put_task.done():
+                put_task.cancel()
+        if put_task in done:
+            return True
+        if not done:
+            # 客户端长时间未读取(已断开或从未连接)，关闭流让生产者退出
+            logger.warning("Stream %s 长时间未被消费，关闭流", chat_id)
+            self.close_stream(chat_id)
+        return False
+        
+    async def send_message(self, chat_id: str, message: bytes, droppable: bool = False) -> None:
         """发送消息到指定的流
         
+        队列已满时等待客户端消费；可丢弃的消息(如状态提示)在队列已满时直接丢弃，
+        不阻塞生产者。丢弃的是新到的消息而不是队列中最早的消息，因为队列中
+        混有不可丢弃的事件帧，无法只挑出其中可丢弃的旧消息。流关闭后直接忽略消息。
+        
+        Args:
+            chat_id: 聊天会话ID
+            message: 要发送的SSE事件帧
+            droppable: 队列已满时是否可以丢弃该消息
+        """
+        queue = self._streams.get(chat_id)
+        if queue is None:
+            return
+        if droppable:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.warning("Stream %s 队列已满，丢弃非关键消息", chat_id)
+            return
+        await self._put(chat_id, queue, message)
+            
+    async def send_messages(self, chat_id: str, messages: List[bytes]) -> None:
+        """批量发送消息到指定的流
+        
+        连续的事件帧拼接为一条队列消息，一次入队、由客户端一次写出；
+        完成和错误事件仍单独入队，保证消费端能识别流的结束。
+        
         Args:
             chat_id: 聊天会话ID
-            message: 要发送的消息
+            messages: 要发送的SSE事件帧列表
         """
-        if chat_id in self._streams:
-            await self._streams[chat_id].put(message)
+        queue = self._streams.get(chat_id)
+        if queue is None or not messages:
+            return
+        batch = []
+        for message in messages:
+            if is_terminal_event(message):
+                if batch:
+                    if not await self._put(chat_id, queue, b"".join(batch)):
+                        return
+                    batch = []
+                if not await self._put(chat_id, queue, message):
+                    return
+            else:
+                batch.append(message)
+        if batch:
+            await self._put(chat_id, queue, b"".join(batch))
             
-    async def get_messages(self, chat_id: str) -> AsyncGenerator[dict, None]:
+    async def get_messages(self, chat_id: str) -> AsyncGenerator[bytes, None]:
         """获取指定流的消息生成器
         
         Args:
             chat_id: 聊天会话ID
             
         Yields:
-            dict: 消息内容
+            bytes: SSE事件帧
         """
         if chat_id not in self._streams:
             raise ValueError(f"Stream {chat_id} not found")
@@ -56,12 +147,11 @@ class StreamManager:
                 queue.task_done()
                 
                 # 如果是完成或错误消息，结束生成器
-                if message.get("event") in ["complete", "error"]:
+                if is_terminal_event(message):
                     break
         finally:
-            # 清理资源
-            if chat_id in self._streams:
-                del self._streams[chat_id]
+            # 清理资源，并唤醒仍在等待入队的生产者
+            self.close_stream(chat_id)
                 
     def close_stream(self, chat_id: str) -> None:
         """关闭指定的流
@@ -69,5 +159,7 @@ class StreamManager:
         Args:
             chat_id: 聊天会话ID
         """
-        if chat_id in self._streams:
-            del self._streams[chat_id]
+        self._streams.pop(chat_id, None)
+        closed = self._closed.pop(chat_id, None)
+        if closed is not None:
+            closed.set()
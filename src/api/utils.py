@@ -1,9 +1,91 @@
 """工具函数模块"""
 
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict
+import asyncio
 import json
+import secrets
 from datetime import datetime
 
+import orjson
+
+def generate_id(prefix: str) -> str:
+    """生成带前缀的唯一ID
+    
+    使用随机十六进制串，同一秒内的并发请求也不会产生相同ID。
+    
+    Args:
+        prefix: ID前缀，如chat、workflow
+        
+    Returns:
+        str: 形如"chat-1a2b3c4d5e6f"的ID
+    """
+    return f"{prefix}-{secrets.token_hex(6)}"
+
+async def coalesce_json_strings(
+    source: AsyncIterator[bytes],
+    window: float = 0.015,
+    max_size: int = 256
+) -> AsyncIterator[bytes]:
+    """把连续到达的JSON字符串字面量合并成较少的片段
+
+    第一个片段到达后最多等待window秒，期间到达的片段拼接成一个字符串字面量，
+    缓冲超过max_size字节时立即输出。逐token到达的流式内容因此合并为少量SSE事件，
+    减少事件帧和网络写入次数。
+
+    Args:
+        source: 生成带引号且已转义的JSON字符串字节的异步迭代器
+        window: 合并等待窗口(秒)，小于等于0时不合并
+        max_size: 单个片段的最大字节数
+
+    Yields:
+        bytes: 合并后的JSON字符串字面量
+    """
+    if window <= 0:
+        async for chunk in source:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = source.__aiter__()
+    pending = None
+    # 去掉结尾引号的已合并内容，输出时再补上
+    buffer = None
+    deadline = 0.0
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if buffer is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if not done:
+                # 窗口到期，输出已合并的内容，下一个片段仍在等待中
+                yield bytes(buffer) + b'"'
+                buffer = None
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                if buffer is not None:
+                    yield bytes(buffer) + b'"'
+                raise
+            if buffer is None:
+                buffer = bytearray(chunk[:-1])
+                deadline = loop.time() + window
+            else:
+                # 两个合法的字符串字面量去掉相邻引号后直接拼接仍是合法的字面量
+                buffer += chunk[1:-1]
+            if len(buffer) >= max_size:
+                yield bytes(buffer) + b'"'
+                buffer = None
+        if buffer is not None:
+            yield bytes(buffer) + b'"'
+    finally:
+        if pending is not None:
+            pending.cancel()
+
 def ensure_serializable(obj: Any) -> Any:
     """确保对象是可JSON序列化的
     
@@ -30,6 +112,24 @@ def ensure_serializable(obj: Any) -> Any:
         except:
             return None
 
+def dumps_json(data: Any, **kwargs) -> bytes:
+    """用orjson序列化为JSON
+
+    orjson不支持超出64位范围的整数，default回调也不会处理它们，
+    遇到这类数据时回退到标准库json，保持与原先一致的输出。
+
+    Args:
+        data: 要序列化的数据
+        **kwargs: 传给orjson.dumps的其他参数，如default
+
+    Returns:
+        bytes: JSON字节串
+    """
+    try:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS, **kwargs)
+    except orjson.JSONEncodeError:
+        return json.dumps(ensure_serializable(data), ensure_ascii=False).encode()
+
 def convert_node_result(node_id: str, result: Any) -> Dict:
     """转换节点结果为可序列化的字典
     
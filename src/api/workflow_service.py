@@ -1,30 +1,41 @@
 """工作流服务模块"""
 
-import json
 import logging
-from typing import Dict, Optional, AsyncGenerator
+import orjson
+from typing import Dict, List, Optional, AsyncGenerator, Tuple
 from ..core.engine import WorkflowEngine, NodeResult
 from ..core.node_config import NodeConfigManager
-from .llm_api import call_llm_api, call_llm_api_stream
+from .llm_api import call_llm_api, call_llm_api_stream_json
+from .utils import dumps_json
 
 # 配置日志记录 
 logger = logging.getLogger(__name__)
 
+# 解释执行结果时每个节点输出保留的最大字符数
+MAX_RESULT_CHARS = 2000
+
 class WorkflowService:
-    def __init__(self, engine: WorkflowEngine):
+    def __init__(self, engine: WorkflowEngine, node_manager: Optional[NodeConfigManager] = None):
+        """
+        Args:
+            engine: 工作流引擎
+            node_manager: 节点配置管理器，为None时首次生成工作流时创建
+        """
         self.engine = engine
+        self.node_manager = node_manager
+        # 由节点配置渲染出的系统消息和用户任务指导，节点配置运行期间不变，只构建一次
+        self._prompts: Optional[Tuple[List[Dict[str, str]], str]] = None
+
+    def _get_prompts(self) -> Tuple[List[Dict[str, str]], str]:
+        """获取生成工作流用的系统消息和用户任务指导，首次调用时构建并缓存
         
-    async def generate_workflow(self, text: str, request_id: str = None) -> Dict:
-        """生成工作流JSON
-        
-        Args:
-            text: 用户输入文本
-            request_id: 请求ID用于日志追踪
-            
         Returns:
-            Dict: 工作流定义
+            Tuple[List[Dict[str, str]], str]: 系统消息列表(作为可缓存前缀)和用户任务指导
         """
-        node_manager = NodeConfigManager()
+        if self._prompts is not None:
+            return self._prompts
+
+        node_manager = self.node_manager or NodeConfigManager()
         node_descriptions = node_manager.get_nodes_description()
         nodes_json_example = node_manager.get_nodes_json_example()
         inference_format = '${node_id.results}'
@@ -64,18 +75,36 @@ class WorkflowService:
 请使用以下JSON格式输出工作流定义：
 
 {nodes_json_example}"""
+
+        self._prompts = ([{"role": "system", "content": system_prompt}], user_prompt)
+        return self._prompts
+        
+    async def generate_workflow(self, text: str, request_id: str = None) -> Dict:
+        """生成工作流JSON
+        
+        Args:
+            text: 用户输入文本
+            request_id: 请求ID用于日志追踪
+            
+        Returns:
+            Dict: 工作流定义
+        """
+        system_messages, user_prompt = self._get_prompts()
         
         messages = [
-            {"role": "system", "content": system_prompt},
             {"role": "user", "content":"问题：" + text  + "\n" + user_prompt}
         ]
         
-                
-        workflow_str = await call_llm_api(messages, request_id)
+        # 系统提示词只随节点配置变化，作为可缓存前缀传入
+        workflow_str = await call_llm_api(messages, request_id, cacheable_prefix=system_messages)
         try:
-            if "```json" in workflow_str:
-                workflow_str = workflow_str.split("```json")[1].split("```")[0]
-            return json.loads(workflow_str)
+            # 按下标截取```json代码块的内容，不必把整个响应拆分成列表
+            start = workflow_str.find("```json")
+            if start != -1:
+                start += len("```json")
+                end = workflow_str.find("```", start)
+                workflow_str = workflow_str[start:end] if end != -1 else workflow_str[start:]
+            return orjson.loads(workflow_str)
         except:
             return {"nodes": [], "edges": []}
 
@@ -85,9 +114,11 @@ class WorkflowService:
         workflow: Dict,
         results: Optional[Dict[str, NodeResult]],
         request_id: str = None
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
         """解释工作流执行结果（流式）
         
+        解释内容以JSON字符串字面量的形式输出，可直接拼接进SSE事件帧
+        
         Args:
             original_text: 用户原始输入
             workflow: 工作流定义
@@ -95,12 +126,13 @@ class WorkflowService:
             request_id: 请求ID用于日志追踪
             
         Yields:
-            str: 解释内容片段
+            bytes: 带引号且已转义的解释内容片段
         """
         workflow_desc = []
+        append = workflow_desc.append
         
         if not results:
-            yield "工作流执行失败，未能获取执行结果。"
+            yield orjson.dumps("工作流执行失败，未能获取执行结果。")
             return
             
         for node in workflow["nodes"]:
@@ -109,11 +141,14 @@ class WorkflowService:
             node_result = results.get(node_id)
             
             if node_result and node_result.success:
-                result_data = node_result.data
-                workflow_desc.append(f"- {node_type}({node_id}): 成功，输出={result_data}")
+                # 节点输出用orjson序列化，比str()递归repr更快且是合法JSON，过长时截断
+                result_data = dumps_json(node_result.data, default=str).decode()
+                if len(result_data) > MAX_RESULT_CHARS:
+                    result_data = result_data[:MAX_RESULT_CHARS] + "…"
+                append(f"- {node_type}({node_id}): 成功，输出={result_data}")
             else:
                 error = node_result.error if node_result else "未执行"
-                workflow_desc.append(f"- {node_type}({node_id}): 失败，错误={error}")
+                append(f"- {node_type}({node_id}): 失败，错误={error}")
         
         workflow_status = "\n".join(workflow_desc)
         
@@ -122,5 +157,5 @@ class WorkflowService:
             {"role": "user", "content": f"{original_text}"}
         ]
         
-        async for chunk in call_llm_api_stream(messages, request_id):
+        async for chunk in call_llm_api_stream_json(messages, request_id):
             yield chunk
@@ -1,7 +1,9 @@
-import json
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Any, Optional, Type, List, Callable, AsyncGenerator, Tuple
+from types import MappingProxyType
+from typing import Dict, Any, Optional, Type, List, Callable, AsyncGenerator, Mapping, Set, Tuple, Union
+
+import orjson
 
 from .enums import NodeStatus, WorkflowStatus
 from .models import NodeResult
@@ -18,9 +20,21 @@ class WorkflowEngine:
         self._running_workflows: Dict[str, asyncio.Task] = {}
         self._workflow_status: Dict[str, WorkflowStatus] = {}
         self._workflow_progress: Dict[str, Dict[str, NodeResult]] = {}
+        # 每个运行中工作流的暂停开关，set表示可以继续执行，clear表示已暂停
+        self._pause_events: Dict[str, asyncio.Event] = {}
+        # 阻塞任务使用的线程池，调用install_default_executor后作为事件循环的默认执行器
         self._thread_pool = ThreadPoolExecutor(max_workers=max_workers)
         self._node_callbacks: List[Callable[[str, str, NodeResult], None]] = []
-        self._node_executor = NodeExecutor(self._thread_pool, self)
+        self._node_executor = NodeExecutor(self)
+
+    def install_default_executor(self):
+        """把引擎线程池设为当前事件循环的默认执行器
+
+        同步节点、节点内部的asyncio.to_thread和Agent工具都使用默认执行器，
+        安装后所有阻塞任务共用这一个线程池，并发数统一由max_workers限制。
+        需要在事件循环中调用一次，如应用启动时。
+        """
+        asyncio.get_running_loop().set_default_executor(self._thread_pool)
         
     def register_node_type(self, type_name: str, node_class: Type[BaseNode]):
         """注册节点类型"""
@@ -34,26 +48,41 @@ class WorkflowEngine:
         """获取工作流状态"""
         return self._workflow_status.get(workflow_id)
         
-    def get_workflow_progress(self, workflow_id: str) -> Optional[Dict[str, NodeResult]]:
-        """获取工作流进度"""
-        return self._workflow_progress.get(workflow_id)
+    def get_workflow_progress(self, workflow_id: str) -> Optional[Mapping[str, NodeResult]]:
+        """获取工作流进度
+
+        Returns:
+            Optional[Mapping[str, NodeResult]]: 各节点最新结果的只读实时视图
+        """
+        progress = self._workflow_progress.get(workflow_id)
+        return MappingProxyType(progress) if progress is not None else None
         
     async def pause_workflow(self, workflow_id: str):
-        """暂停工作流"""
-        if workflow_id in self._running_workflows:
+        """暂停工作流，已开始执行的节点继续完成，尚未开始的节点等待恢复"""
+        pause_event = self._pause_events.get(workflow_id)
+        if pause_event is not None and self._workflow_status.get(workflow_id) == WorkflowStatus.RUNNING:
             self._workflow_status[workflow_id] = WorkflowStatus.PAUSED
+            pause_event.clear()
             
     async def resume_workflow(self, workflow_id: str):
         """恢复工作流"""
         if workflow_id in self._workflow_status:
             if self._workflow_status[workflow_id] == WorkflowStatus.PAUSED:
                 self._workflow_status[workflow_id] = WorkflowStatus.RUNNING
+                pause_event = self._pause_events.get(workflow_id)
+                if pause_event is not None:
+                    pause_event.set()
                 
     async def cancel_workflow(self, workflow_id: str):
         """取消工作流"""
         if workflow_id in self._running_workflows:
             self._running_workflows[workflow_id].cancel()
             self._workflow_status[workflow_id] = WorkflowStatus.CANCELLED
+        pause_event = self._pause_events.get(workflow_id)
+        if pause_event is not None:
+            self._workflow_status[workflow_id] = WorkflowStatus.CANCELLED
+            # 唤醒等待恢复的节点，使其看到取消状态后直接退出
+            pause_event.set()
             
     def register_node_callback(self, callback: Callable[[str, str, NodeResult], None]):
         """注册节点执行回调函数"""
@@ -78,34 +107,37 @@ class WorkflowEngine:
         }
 
     async def _check_workflow_status(self, workflow_id: str) -> bool:
-        """检查工作流状态"""
-        while self._workflow_status[workflow_id] == WorkflowStatus.PAUSED:
-            await asyncio.sleep(1)
+        """检查工作流状态，暂停时等待恢复或取消
+
+        Returns:
+            bool: 工作流未被取消、可以继续执行节点时返回True
+        """
+        pause_event = self._pause_events.get(workflow_id)
+        if pause_event is not None and not pause_event.is_set():
+            await pause_event.wait()
         return self._workflow_status[workflow_id] != WorkflowStatus.CANCELLED
 
     async def _process_node(
         self,
         node: Dict,
         workflow_id: str,
-        dependencies: Dict[str, Any],
-        nodes: List[Dict],
-        results: Dict[str, NodeResult]
+        results: Dict[str, NodeResult],
+        stream_queue: Optional["asyncio.Queue[Tuple[str, NodeResult]]"] = None
     ):
-        """处理单个节点"""
+        """处理单个节点
+
+        只执行节点本身，下游节点由_run_graph在其依赖全部成功后派发
+
+        Args:
+            node: 节点定义
+            workflow_id: 工作流ID
+            results: 执行结果
+            stream_queue: 流式执行时推送(节点ID, 结果)的队列，RUNNING状态只推送一次
+        """
         node_id = node["id"]
         
-        # 检查工作流状态
-        if self._workflow_status[workflow_id] == WorkflowStatus.CANCELLED:
-            return
-            
-        # 检查依赖
-        if not self._node_executor._check_dependencies(node_id, dependencies, results):
-            results[node_id] = NodeResult(
-                success=False,
-                status=NodeStatus.FAILED,
-                error="依赖节点执行失败"
-            )
-            self._workflow_progress[workflow_id] = results.copy()
+        # 检查工作流状态，暂停时在此等待恢复
+        if not await self._check_workflow_status(workflow_id):
             return
             
         # 处理参数
@@ -113,155 +145,149 @@ class WorkflowEngine:
         processed_params = ParamsProcessor.process_params(node["params"], results, context)
             
         # 执行节点并处理中间结果
-        final_result = None
+        running_status_sent = False
         async for result in self._node_executor.execute_node(node, processed_params, self._node_types):
+            if stream_queue is not None and result.status == NodeStatus.RUNNING:
+                # 流式执行时已经推送过 RUNNING 状态，只更新数据；
+                # 换成新的结果对象，不修改已入队、可能尚未被消费的结果
+                if running_status_sent:
+                    if result.data:
+                        results[node_id] = result
+                    continue
+                running_status_sent = True
             # 更新最新结果
             results[node_id] = result
-            # 更新工作流进度
-            self._workflow_progress[workflow_id] = results.copy()
             # 通知节点状态更新
             self._notify_node_completion(workflow_id, node_id, result)
-            # 保存最终结果
-            if result.status in [NodeStatus.COMPLETED, NodeStatus.FAILED]:
-                final_result = result
-        
-        # 处理下游节点
-        if final_result and final_result.success:
-            downstream_nodes = self._node_executor._get_downstream_nodes(
-                node_id, nodes, dependencies, results
-            )
-            
-            # 创建下游节点的任务
-            tasks = []
-            for n in downstream_nodes:
-                # 为下游节点添加context
-                n_with_context = {**n, "context": context}
-                task = asyncio.create_task(
-                    self._process_node(n_with_context, workflow_id, dependencies, nodes, results)
-                )
-                tasks.append(task)
-            
-            # 等待所有下游节点完成
-            if tasks:
-                await asyncio.gather(*tasks)
+            if stream_queue is not None:
+                stream_queue.put_nowait((node_id, result))
+
+    @staticmethod
+    def _build_graph(
+        nodes: List[Dict], edges: List[Dict]
+    ) -> Tuple[Dict[str, Dict], Dict[str, List[str]], Dict[str, Set[str]]]:
+        """一次遍历边构建调度所需的图结构，重复的边只计一次
 
-    async def _process_node_stream(
+        Returns:
+            Tuple: 按ID索引的节点、每个节点的子节点列表、每个节点依赖的上游节点集合
+        """
+        nodes_by_id = {node["id"]: node for node in nodes}
+        children: Dict[str, List[str]] = {node_id: [] for node_id in nodes_by_id}
+        dependencies: Dict[str, Set[str]] = {node_id: set() for node_id in nodes_by_id}
+        for edge in edges:
+            parents = dependencies[edge["to"]]
+            if edge["from"] not in parents:
+                parents.add(edge["from"])
+                children.setdefault(edge["from"], []).append(edge["to"])
+        return nodes_by_id, children, dependencies
+
+    async def _run_graph(
         self,
-        node: Dict,
         workflow_id: str,
-        dependencies: Dict[str, Any],
-        nodes: List[Dict],
-        results: Dict[str, NodeResult]
-    ) -> AsyncGenerator[Tuple[str, NodeResult], None]:
-        """流式处理单个节点"""
-        node_id = node["id"]
-        
-        # 检查工作流状态
-        if self._workflow_status[workflow_id] == WorkflowStatus.CANCELLED:
-            return
-            
-        # 检查依赖
-        if not self._node_executor._check_dependencies(node_id, dependencies, results):
-            result = NodeResult(
-                success=False,
-                status=NodeStatus.FAILED,
-                error="依赖节点执行失败"
-            )
-            results[node_id] = result
-            self._workflow_progress[workflow_id] = results.copy()
-            yield node_id, result
-            return
-            
-        # 处理参数
-        context = node.get("context", {})
-        processed_params = ParamsProcessor.process_params(node["params"], results, context)
-            
-        # 执行节点并处理中间结果
-        running_status_sent = False
-        async for result in self._node_executor.execute_node(node, processed_params, self._node_types):
-            # 更新最新结果
-            if result.status == NodeStatus.RUNNING:
-                if not running_status_sent:
-                    running_status_sent = True
-                    results[node_id] = result
-                    # 更新工作流进度
-                    self._workflow_progress[workflow_id] = results.copy()
-                    # 通知节点状态更新并返回结果
-                    self._notify_node_completion(workflow_id, node_id, result)
-                    yield node_id, result
-                # 如果已经发送过 RUNNING 状态，只更新数据
-                elif result.data:
-                    results[node_id].data = result.data
-            else:
-                # 对于非 RUNNING 状态（COMPLETED/FAILED），正常处理
-                results[node_id] = result
-                # 更新工作流进度
-                self._workflow_progress[workflow_id] = results.copy()
-                # 通知节点状态更新并返回结果
-                self._notify_node_completion(workflow_id, node_id, result)
-                yield node_id, result
-                
-            # 如果节点执行完成且成功，处理下游节点
-            if result.status == NodeStatus.COMPLETED and result.success:
-                downstream_nodes = self._node_executor._get_downstream_nodes(
-                    node_id, nodes, dependencies, results
-                )
-                
-                # 直接处理下游节点
-                for n in downstream_nodes:
-                    # 为下游节点添加context
-                    n_with_context = {**n, "context": context}
-                    async for node_result in self._process_node_stream(
-                        n_with_context, workflow_id, dependencies, nodes, results
-                    ):
-                        yield node_result
+        nodes_by_id: Dict[str, Dict],
+        children: Dict[str, List[str]],
+        dependencies: Dict[str, Set[str]],
+        context: Optional[Dict[str, Any]],
+        results: Dict[str, NodeResult],
+        stream_queue: Optional["asyncio.Queue[Tuple[str, NodeResult]]"] = None
+    ):
+        """按拓扑顺序(Kahn算法)调度执行节点
+
+        入度为0的节点立即并发执行；节点成功后把每个子节点的剩余入度减一，
+        降为0时才派发该子节点，每个节点只会执行一次。失败节点的下游不会被派发。
+        流式执行时节点结果同时推送到stream_queue。
+        """
+        remaining = {node_id: len(parents) for node_id, parents in dependencies.items()}
+        running: Dict[asyncio.Task, str] = {}
+
+        def dispatch(node_id: str):
+            node = nodes_by_id[node_id]
+            # 将context添加到节点中
+            if context:
+                node = {**node, "context": context}
+            task = asyncio.create_task(self._process_node(node, workflow_id, results, stream_queue))
+            running[task] = node_id
+
+        for node_id, degree in remaining.items():
+            if degree == 0:
+                dispatch(node_id)
+
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = running.pop(task)
+                    # 节点执行中抛出的异常在此向上传播
+                    task.result()
+                    result = results.get(node_id)
+                    if result is None or not result.success:
+                        continue
+                    for child_id in children[node_id]:
+                        remaining[child_id] -= 1
+                        if remaining[child_id] == 0:
+                            dispatch(child_id)
+        finally:
+            # 出错或被取消时停止仍在执行的节点
+            for task in running:
+                task.cancel()
+
+    @staticmethod
+    def _load_workflow(workflow: Union[str, bytes, Dict[str, Any]]) -> Dict[str, Any]:
+        """获取工作流定义字典，已解析的字典直接使用，JSON文本才需要解析"""
+        if isinstance(workflow, dict):
+            return workflow
+        return orjson.loads(workflow)
 
     async def execute_workflow_stream(
         self,
-        workflow_json: str,
+        workflow: Union[str, bytes, Dict[str, Any]],
         workflow_id: str,
         global_params: Optional[Dict[str, Any]] = None,
         context: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[Tuple[str, NodeResult], None]:
         """流式执行工作流"""
-        workflow = json.loads(workflow_json)
+        workflow = self._load_workflow(workflow)
         
         # 验证工作流
         self.validate_workflow(workflow)
         
         nodes = workflow["nodes"]
-        edges = workflow.get("edges", [])  # edges字段可选，默认为空列表
-        
-        # 构建节点依赖图
-        dependencies: Dict[str, Any] = {node["id"]: set() for node in nodes}
-        for edge in edges:
-            dependencies[edge["to"]].add(edge["from"])
+        # 一次遍历边构建节点索引、子节点列表和依赖图
+        nodes_by_id, children, dependencies = self._build_graph(
+            nodes, workflow.get("edges", [])  # edges字段可选，默认为空列表
+        )
             
         # 初始化工作流状态
         self._workflow_status[workflow_id] = WorkflowStatus.RUNNING
-        self._workflow_progress[workflow_id] = {}
+        pause_event = asyncio.Event()
+        pause_event.set()
+        self._pause_events[workflow_id] = pause_event
         results: Dict[str, NodeResult] = {}
+        # 进度直接引用实时更新的结果字典，节点完成时不再整体复制
+        self._workflow_progress[workflow_id] = results
+        
+        # 调度在后台任务中进行，节点结果经队列按完成顺序逐个返回，不再逐层递归转发；
+        # 调度结束(包括出错)后放入None作为结束标记
+        stream_queue: "asyncio.Queue[Optional[Tuple[str, NodeResult]]]" = asyncio.Queue()
+
+        async def schedule():
+            try:
+                await self._run_graph(
+                    workflow_id, nodes_by_id, children, dependencies, context, results, stream_queue
+                )
+            finally:
+                stream_queue.put_nowait(None)
+
+        scheduler = asyncio.create_task(schedule())
         
         try:
-            # 获取入口节点（没有入度的节点）
-            entry_nodes = [
-                node for node in nodes
-                if not dependencies[node["id"]]
-            ]
-            
-            # 处理入口节点
-            for node in entry_nodes:
-                # 将context添加到节点中
-                node_with_context = {**node, "context": context} if context else node
-                # 创建异步生成器任务
-                async for node_result in self._process_node_stream(
-                    node_with_context,
-                    workflow_id,
-                    dependencies,
-                    nodes,
-                    results
-                ):
-                    yield node_result
+            while True:
+                node_result = await stream_queue.get()
+                if node_result is None:
+                    break
+                yield node_result
+            # 调度过程中抛出的异常在此向上传播
+            await scheduler
                     
             # 检查是否所有节点都执行成功
             all_success = all(
@@ -269,11 +295,12 @@ class WorkflowEngine:
                 for node in nodes
             )
             
-            # 更新工作流最终状态
-            self._workflow_status[workflow_id] = (
-                WorkflowStatus.COMPLETED if all_success
-                else WorkflowStatus.FAILED
-            )
+            # 更新工作流最终状态，已取消的工作流保持取消状态
+            if self._workflow_status[workflow_id] != WorkflowStatus.CANCELLED:
+                self._workflow_status[workflow_id] = (
+                    WorkflowStatus.COMPLETED if all_success
+                    else WorkflowStatus.FAILED
+                )
             
         except asyncio.CancelledError:
             self._workflow_status[workflow_id] = WorkflowStatus.CANCELLED
@@ -282,60 +309,42 @@ class WorkflowEngine:
             self._workflow_status[workflow_id] = WorkflowStatus.FAILED
             raise
         finally:
+            # 调用方提前停止迭代时一并停止调度
+            scheduler.cancel()
+            self._pause_events.pop(workflow_id, None)
             if workflow_id in self._running_workflows:
                 del self._running_workflows[workflow_id]
 
     async def execute_workflow(
         self,
-        workflow_json: str,
+        workflow: Union[str, bytes, Dict[str, Any]],
         workflow_id: str,
         global_params: Optional[Dict[str, Any]] = None,
         context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, NodeResult]:
         """执行工作流"""
-        workflow = json.loads(workflow_json)
+        workflow = self._load_workflow(workflow)
         
         # 验证工作流
         self.validate_workflow(workflow)
         
         nodes = workflow["nodes"]
-        edges = workflow.get("edges", [])  # edges字段可选，默认为空列表
-        
-        # 构建节点依赖图
-        dependencies: Dict[str, Any] = {node["id"]: set() for node in nodes}
-        for edge in edges:
-            dependencies[edge["to"]].add(edge["from"])
+        nodes_by_id, children, dependencies = self._build_graph(
+            nodes, workflow.get("edges", [])  # edges字段可选，默认为空列表
+        )
             
         # 初始化工作流状态
         self._workflow_status[workflow_id] = WorkflowStatus.RUNNING
-        self._workflow_progress[workflow_id] = {}
+        pause_event = asyncio.Event()
+        pause_event.set()
+        self._pause_events[workflow_id] = pause_event
         results: Dict[str, NodeResult] = {}
+        # 进度直接引用实时更新的结果字典，节点完成时不再整体复制
+        self._workflow_progress[workflow_id] = results
         
         try:
-            # 获取入口节点（没有入度的节点）
-            entry_nodes = [
-                node for node in nodes
-                if not dependencies[node["id"]]
-            ]
-            
-            # 创建入口节点的任务
-            tasks = []
-            for node in entry_nodes:
-                # 将context添加到节点中
-                node_with_context = {**node, "context": context} if context else node
-                task = asyncio.create_task(
-                    self._process_node(
-                        node_with_context,
-                        workflow_id,
-                        dependencies,
-                        nodes,
-                        results
-                    )
-                )
-                tasks.append(task)
-                
-            # 等待所有任务完成
-            await asyncio.gather(*tasks)
+            # 按拓扑顺序调度执行所有节点
+            await self._run_graph(workflow_id, nodes_by_id, children, dependencies, context, results)
             
             # 检查是否所有节点都执行成功
             all_success = all(
@@ -343,11 +352,12 @@ class WorkflowEngine:
                 for node in nodes
             )
             
-            # 更新工作流最终状态
-            self._workflow_status[workflow_id] = (
-                WorkflowStatus.COMPLETED if all_success
-                else WorkflowStatus.FAILED
-            )
+            # 更新工作流最终状态，已取消的工作流保持取消状态
+            if self._workflow_status[workflow_id] != WorkflowStatus.CANCELLED:
+                self._workflow_status[workflow_id] = (
+                    WorkflowStatus.COMPLETED if all_success
+                    else WorkflowStatus.FAILED
+                )
             
             return results
             
@@ -358,5 +368,6 @@ class WorkflowEngine:
             self._workflow_status[workflow_id] = WorkflowStatus.FAILED
             raise
         finally:
+            self._pause_events.pop(workflow_id, None)
             if workflow_id in self._running_workflows:
                 del self._running_workflows[workflow_id]
@@ -1,20 +1,34 @@
 import time
 import asyncio
-import concurrent.futures
-from typing import Dict, Any, AsyncGenerator, Type, Set, List
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, AsyncGenerator, Callable, Type, List
 
 from .models import NodeResult
 from .enums import NodeStatus, WorkflowStatus
 from .params import ParamsProcessor
 from ..nodes.base import BaseNode
 
+def _collect(func: Callable[[Dict[str, Any]], Any], params: Dict[str, Any]) -> List[Any]:
+    """调用同步生成器方法并取出全部结果，在线程池中执行"""
+    return list(func(params))
+
 class NodeExecutor:
     """节点执行器"""
     
-    def __init__(self, thread_pool: ThreadPoolExecutor, engine=None):
-        self._thread_pool = thread_pool
+    def __init__(self, engine=None):
         self._engine = engine
+        # 无状态节点类到其共享实例的映射，首次执行时创建
+        self._node_instances: Dict[Type[BaseNode], BaseNode] = {}
+        # 节点类的execute是否为异步方法，每个节点类只判断一次
+        self._node_is_async: Dict[Type[BaseNode], bool] = {}
+
+    def _get_node_instance(self, node_class: Type[BaseNode]) -> BaseNode:
+        """获取节点实例，无状态节点复用同一个实例，有状态节点每次新建"""
+        if not node_class.stateless:
+            return node_class()
+        node_instance = self._node_instances.get(node_class)
+        if node_instance is None:
+            node_instance = self._node_instances[node_class] = node_class()
+        return node_instance
         
     async def execute_node(
         self,
@@ -35,14 +49,17 @@ class NodeExecutor:
 
         try:
             node_class = node_types[node["type"]]
-            node_instance = node_class()
+            node_instance = self._get_node_instance(node_class)
             # 如果是LoopNode，注入engine
             if node["type"] == "loop_node":
                 node_instance.init_engine(self._engine)
             
-            # 使用线程池执行节点
-            loop = asyncio.get_event_loop()
-            if asyncio.iscoroutinefunction(node_instance.execute):
+            # 同步调用统一用asyncio.to_thread交给事件循环的默认执行器，
+            # 与节点内部的asyncio.to_thread共用同一个线程池
+            is_async = self._node_is_async.get(node_class)
+            if is_async is None:
+                is_async = self._node_is_async[node_class] = asyncio.iscoroutinefunction(node_class.execute)
+            if is_async:
                 # 如果是异步生成器方法，直接获取结果流
                 if hasattr(node_instance.execute, '__aiter__'):
                     async for intermediate_result in node_instance.execute(processed_params):
@@ -56,33 +73,29 @@ class NodeExecutor:
                         yield running_result
                         result = intermediate_result
                 else:
-                    # 如果是普通异步方法，在线程池中等待其完成
+                    # 普通异步方法直接在当前事件循环中执行
                     result = await node_instance.execute(processed_params)
             else:
                 # 如果是同步方法，检查是否是生成器
                 if hasattr(node_instance.execute, '__iter__'):
-                    # 同步生成器方法
-                    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-                    try:
-                        for intermediate_result in await loop.run_in_executor(
-                            executor,
-                            lambda: list(node_instance.execute(processed_params))
-                        ):
-                            # 创建中间结果
-                            running_result = NodeResult(
-                                success=True,
-                                status=NodeStatus.RUNNING,
-                                data=intermediate_result,
-                                start_time=start_time
-                            )
-                            yield running_result
-                            result = intermediate_result
-                    finally:
-                        executor.shutdown(wait=False)
+                    # 同步生成器方法，在共享线程池中取完所有中间结果
+                    for intermediate_result in await asyncio.to_thread(
+                        _collect,
+                        node_instance.execute,
+                        processed_params
+                    ):
+                        # 创建中间结果
+                        running_result = NodeResult(
+                            success=True,
+                            status=NodeStatus.RUNNING,
+                            data=intermediate_result,
+                            start_time=start_time
+                        )
+                        yield running_result
+                        result = intermediate_result
                 else:
                     # 普通同步方法
-                    result = await loop.run_in_executor(
-                        self._thread_pool,
+                    result = await asyncio.to_thread(
                         node_instance.execute,
                         processed_params
                     )
@@ -107,32 +120,3 @@ class NodeExecutor:
                 end_time=end_time
             )
             yield error_result
-
-    def _check_dependencies(
-        self,
-        node_id: str,
-        dependencies: Dict[str, Set[str]],
-        results: Dict[str, NodeResult]
-    ) -> bool:
-        """检查节点依赖是否满足"""
-        for dep_id in dependencies[node_id]:
-            if dep_id not in results or not results[dep_id].success:
-                return False
-        return True
-
-    def _get_downstream_nodes(
-        self,
-        node_id: str,
-        nodes: List[Dict],
-        dependencies: Dict[str, Set[str]],
-        results: Dict[str, NodeResult]
-    ) -> List[Dict]:
-        """获取可执行的下游节点"""
-        return [
-            n for n in nodes
-            if node_id in dependencies[n["id"]]
-            and all(
-                dep in results and results[dep].success
-                for dep in dependencies[n["id"]]
-            )
-        ]
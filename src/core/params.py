@@ -1,10 +1,73 @@
 import re
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple, Union
 from .models import NodeResult
 
+# 字符串中嵌入的参数表达式，如 "前缀${node1.items[0].name}后缀"
+_EXPRESSION_PATTERN = re.compile(r'\${([a-zA-Z0-9_]+)(?:\.([a-zA-Z0-9_]+)|\[(\d+)\])*}')
+
+@lru_cache(maxsize=4096)
+def _parse_reference(expr: str) -> Tuple[str, Tuple[Union[str, int], ...]]:
+    """解析去掉${}后的引用表达式，结果按表达式缓存，同一表达式只解析一次
+
+    Args:
+        expr: 引用表达式，如 "node1.items[0].name"
+
+    Returns:
+        Tuple: 引用的节点ID或上下文变量名，以及逐级访问的字段路径(数组下标为int)
+    """
+    parts = []
+    current_part = ""
+    i = 0
+    while i < len(expr):
+        if expr[i] == '.':
+            if current_part:
+                parts.append(current_part)
+                current_part = ""
+        elif expr[i] == '[':
+            if current_part:
+                parts.append(current_part)
+                current_part = ""
+            # Extract array index
+            i += 1
+            index = ""
+            while i < len(expr) and expr[i] != ']':
+                index += expr[i]
+                i += 1
+            parts.append(int(index))
+        else:
+            current_part += expr[i]
+        i += 1
+    if current_part:
+        parts.append(current_part)
+
+    if len(parts) > 1:
+        return parts[0], tuple(parts[1:])
+    return expr, ()
+
+def _resolve_fields(current: Any, field_parts: Tuple[Union[str, int], ...]) -> Any:
+    """按字段路径逐级访问引用的值"""
+    for field in field_parts:
+        if isinstance(field, int):
+            # Handle array index
+            if not isinstance(current, (list, tuple)):
+                raise ValueError(f"Cannot use array index on non-sequence type: {type(current)}")
+            if field >= len(current):
+                raise ValueError(f"Array index {field} out of range for length {len(current)}")
+            current = current[field]
+        elif isinstance(current, dict):
+            if field not in current:
+                raise ValueError(f"结果中不存在字段: {field}")
+            current = current[field]
+        elif hasattr(current, field):
+            current = getattr(current, field)
+        else:
+            raise ValueError(f"无法从 {type(current)} 访问字段: {field}")
+    return current
+
 class ParamsProcessor:
     """参数处理器"""
-    
+
     @staticmethod
     def process_params(
         params: Dict[str, Any],
@@ -12,114 +75,30 @@ class ParamsProcessor:
         context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """处理节点参数，支持嵌套参数和表达式替换
-        
+
         Args:
             params: 原始参数
             results: 已有的执行结果
             context: 上下文变量
-            
+
         Returns:
             Dict[str, Any]: 处理后的参数
         """
-        def replace_expression(value: str) -> str:
-            """替换字符串中的所有参数表达式"""
-            pattern = r'\${([a-zA-Z0-9_]+)(?:\.([a-zA-Z0-9_]+)|\[(\d+)\])*}'
-            
-            def replace(match):
-                full_match = match.group(0)
-                expr = match.group(0)[2:-1]  # Remove ${...}
-                parts = []
-                current_part = ""
-                i = 0
-                while i < len(expr):
-                    if expr[i] == '.':
-                        if current_part:
-                            parts.append(current_part)
-                            current_part = ""
-                    elif expr[i] == '[':
-                        if current_part:
-                            parts.append(current_part)
-                            current_part = ""
-                        # Extract array index
-                        i += 1
-                        index = ""
-                        while i < len(expr) and expr[i] != ']':
-                            index += expr[i]
-                            i += 1
-                        parts.append(f"[{index}]")
-                    else:
-                        current_part += expr[i]
-                    i += 1
-                if current_part:
-                    parts.append(current_part)
-                
-                node_id = parts[0]
-                field_parts = parts[1:]
-                
-                if node_id not in results:
-                    raise ValueError(f"引用了未执行的节点: {node_id}")
-                if not results[node_id].data:
-                    raise ValueError(f"节点 {node_id} 没有返回数据")
-                    
-                current = results[node_id].data
-                for field in field_parts:
-                    if field.startswith('[') and field.endswith(']'):
-                        # Handle array index
-                        index = int(field[1:-1])
-                        if not isinstance(current, (list, tuple)):
-                            raise ValueError(f"Cannot use array index on non-sequence type: {type(current)}")
-                        if index >= len(current):
-                            raise ValueError(f"Array index {index} out of range for length {len(current)}")
-                        current = current[index]
-                    elif isinstance(current, dict):
-                        if field not in current:
-                            raise ValueError(f"节点 {node_id} 的结果中不存在字段: {field}")
-                        current = current[field]
-                    elif hasattr(current, field):
-                        current = getattr(current, field)
-                    else:
-                        raise ValueError(f"无法从 {type(current)} 访问字段: {field}")
-                return str(current)
-                
-            return re.sub(pattern, replace, value)
-            
+        def replace(match) -> str:
+            """替换单个嵌入的参数表达式，只能引用节点结果"""
+            node_id, field_parts = _parse_reference(match.group(0)[2:-1])  # Remove ${...}
+            if node_id not in results:
+                raise ValueError(f"引用了未执行的节点: {node_id}")
+            if not results[node_id].data:
+                raise ValueError(f"节点 {node_id} 没有返回数据")
+            return str(_resolve_fields(results[node_id].data, field_parts))
+
         def process_value(value: Any) -> Any:
             """递归处理参数值"""
             if isinstance(value, str):
                 # 处理完整的参数引用 (如 "${node1.param}" 或 "${item.field1.field2}")
                 if value.startswith("${") and value.endswith("}"):
-                    ref_value = value[2:-1]  # Remove ${...}
-                    parts = []
-                    current_part = ""
-                    i = 0
-                    while i < len(ref_value):
-                        if ref_value[i] == '.':
-                            if current_part:
-                                parts.append(current_part)
-                                current_part = ""
-                        elif ref_value[i] == '[':
-                            if current_part:
-                                parts.append(current_part)
-                                current_part = ""
-                            # Extract array index
-                            i += 1
-                            index = ""
-                            while i < len(ref_value) and ref_value[i] != ']':
-                                index += ref_value[i]
-                                i += 1
-                            parts.append(f"[{index}]")
-                        else:
-                            current_part += ref_value[i]
-                        i += 1
-                    if current_part:
-                        parts.append(current_part)
-                    
-                    if len(parts) > 1:
-                        ref_node = parts[0]
-                        field_parts = parts[1:]
-                    else:
-                        ref_node = ref_value
-                        field_parts = []
+                    ref_node, field_parts = _parse_reference(value[2:-1])  # Remove ${...}
 
                     # 先检查是否是上下文变量
                     if context and ref_node in context:
@@ -131,30 +110,13 @@ class ParamsProcessor:
                         current = results[ref_node].data
                     else:
                         raise ValueError(f"引用了未执行的节点或未定义的上下文变量: {ref_node}")
-                    
+
                     # 逐级访问字段
-                    for field in field_parts:
-                        if field.startswith('[') and field.endswith(']'):
-                            # Handle array index
-                            index = int(field[1:-1])
-                            if not isinstance(current, (list, tuple)):
-                                raise ValueError(f"Cannot use array index on non-sequence type: {type(current)}")
-                            if index >= len(current):
-                                raise ValueError(f"Array index {index} out of range for length {len(current)}")
-                            current = current[index]
-                        elif isinstance(current, dict):
-                            if field not in current:
-                                raise ValueError(f"结果中不存在字段: {field}")
-                            current = current[field]
-                        elif hasattr(current, field):
-                            current = getattr(current, field)
-                        else:
-                            raise ValueError(f"无法从 {type(current)} 访问字段: {field}")
-                    return current
+                    return _resolve_fields(current, field_parts)
 
                 # 处理包含参数表达式的字符串
                 elif "${" in value and "}" in value:
-                    return replace_expression(value)
+                    return _EXPRESSION_PATTERN.sub(replace, value)
                 return value
             elif isinstance(value, dict):
                 # 检查是否为工作流节点（包含nodes节点）
@@ -164,4 +126,4 @@ class ParamsProcessor:
             elif isinstance(value, list):
                 return [process_value(item) for item in value]
             return value
-        return {key: process_value(value) for key, value in params.items()}
\ No newline at end of file
+        return {key: process_value(value) for key, value in params.items()}
@@ -1,5 +1,6 @@
 """arxiv论文搜索节点"""
 
+import asyncio
 import arxiv
 import requests
 import tempfile
@@ -32,6 +33,12 @@ class ArxivSearchNode(BaseNode):
                 "results": [],
             }
 
+        # arxiv客户端和PDF下载都是同步阻塞调用，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(self._search, query)
+
+    @staticmethod
+    def _search(query: str) -> Dict[str, Any]:
+        """同步搜索论文并下载提取PDF全文"""
         try:
             # 创建搜索客户端
             client = arxiv.Client()
@@ -6,6 +6,10 @@ from typing import Dict, Any
 class BaseNode(ABC):
     """节点基类"""
     
+    # 节点实例不保存执行相关的状态时为True，执行器复用同一个实例而不是每次执行都创建；
+    # 执行过程中会修改实例属性的节点需要设为False
+    stateless: bool = True
+    
     @abstractmethod
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """执行节点
@@ -13,15 +13,17 @@ class ChatNode(BaseNode):
         temperature = float(params.get("temperature", 0.7))
         system_prompt = str(params.get("system_prompt", ""))
 
-        messages = []
+        messages = [{"role": "user", "content": user_question}]
 
+        # 系统提示词在同一节点的多次执行间保持不变，作为可缓存前缀传入
+        cacheable_prefix = None
         if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-
-        messages.append({"role": "user", "content": user_question})
+            cacheable_prefix = [{"role": "system", "content": system_prompt}]
 
         try:
-            response = await call_llm_api(messages, temperature=temperature)
+            response = await call_llm_api(
+                messages, temperature=temperature, cacheable_prefix=cacheable_prefix
+            )
             return {"response": response}
         except Exception as e:
             raise ValueError(f"LLM API call failed: {str(e)}")
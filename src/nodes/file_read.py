@@ -1,5 +1,6 @@
 """文件读取节点"""
 
+import asyncio
 import os
 from typing import Dict, Any
 from .base import BaseNode
@@ -9,6 +10,12 @@ class FileReadNode(BaseNode):
     """文件读取节点"""
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # 文件读取为同步阻塞IO，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(self._read_file, params)
+
+    @staticmethod
+    def _read_file(params: Dict[str, Any]) -> Dict[str, Any]:
+        """同步读取文件内容"""
         file_path = str(params["path"])
         encoding = str(params.get("encoding", "utf-8"))
 
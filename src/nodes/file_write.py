@@ -1,5 +1,6 @@
 """文件写入节点"""
 
+import asyncio
 import os
 from typing import Dict, Any
 from .base import BaseNode
@@ -15,6 +16,11 @@ class FileWriteNode(BaseNode):
         self.default_write_path = API_CONFIG["file_write_path"]
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # 文件写入为同步阻塞IO，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(self._write_file, params)
+
+    def _write_file(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """同步写入文件"""
         filename = params.get("filename")
         content = params.get("content")
         format = params.get("format", "txt")  # 默认格式为txt
@@ -1,7 +1,6 @@
 from typing import List, Dict, Any, Union
 from .base import BaseNode
 from ..core.models import NodeResult
-import json
 import asyncio
 import logging
 
@@ -9,6 +8,9 @@ logger = logging.getLogger(__name__)
 
 
 class LoopNode(BaseNode):
+    # 执行时会注入引擎实例，不能在多次执行间共享
+    stateless = False
+
     def __init__(self):
         super().__init__()
         self._engine = None
@@ -154,8 +156,9 @@ class LoopNode(BaseNode):
                 sub_engine.register_node_type(type_name, node_class)
 
         # 传递循环上下文，但不预处理workflow_json中的参数
+        # 引擎直接接受字典且不会修改定义，各次迭代共用同一份workflow_json
         workflow_results = await sub_engine.execute_workflow(
-            workflow_json=json.dumps(workflow_json),
+            workflow=workflow_json,
             workflow_id=workflow_id,
             context=context,
         )
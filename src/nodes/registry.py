@@ -0,0 +1,37 @@
+"""内置节点类型注册表
+
+显式导入所有内置节点类，启动时一次导入即可拿到全部节点类型，
+不必按配置逐个动态导入模块再按类名查找。新增内置节点时需同步更新此处。
+"""
+
+from typing import Dict, Type
+
+from .base import BaseNode
+from .api_call import ApiCallNode
+from .arxiv_search import ArxivSearchNode
+from .chat import ChatNode
+from .db_execute import DbExecuteNode
+from .db_query import DbQueryNode
+from .file_read import FileReadNode
+from .file_write import FileWriteNode
+from .loop_node import LoopNode
+from .python_execute import PythonExecuteNode
+from .serper_search import SerperSearchNode
+from .terminal import TerminalNode
+from .web_crawler import SerperWebCrawlerNode
+
+# 节点type(即模块名)到节点类的映射
+NODE_TYPES: Dict[str, Type[BaseNode]] = {
+    "api_call": ApiCallNode,
+    "arxiv_search": ArxivSearchNode,
+    "chat": ChatNode,
+    "db_execute": DbExecuteNode,
+    "db_query": DbQueryNode,
+    "file_read": FileReadNode,
+    "file_write": FileWriteNode,
+    "loop_node": LoopNode,
+    "python_execute": PythonExecuteNode,
+    "serper_search": SerperSearchNode,
+    "terminal": TerminalNode,
+    "web_crawler": SerperWebCrawlerNode,
+}
@@ -1,5 +1,6 @@
 """终端命令执行节点"""
 
+import asyncio
 import subprocess
 from typing import Dict, Any
 from .base import BaseNode
@@ -9,6 +10,12 @@ class TerminalNode(BaseNode):
     """终端命令执行节点"""
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # subprocess.run为同步阻塞调用，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(self._run_command, params)
+
+    @staticmethod
+    def _run_command(params: Dict[str, Any]) -> Dict[str, Any]:
+        """同步执行shell命令"""
         command = str(params["command"])
         shell = params.get("shell", True)
 
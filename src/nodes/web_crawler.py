@@ -1,4 +1,5 @@
 from typing import Dict, Any
+import asyncio
 import os
 import logging
 import time
@@ -24,11 +25,16 @@ class SerperWebCrawlerNode(BaseNode):
         self.api_url = "https://scrape.serper.dev"
 
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        start_time = time.time()
         url = str(params.get("url", "")).strip()
         if not url:
             raise ValueError("url参数不能为空")
 
+        # requests为同步阻塞调用，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(self._scrape, url)
+
+    def _scrape(self, url: str) -> Dict[str, Any]:
+        """同步调用Serper API抓取网页正文"""
+        start_time = time.time()
         logger.info(f"开始爬取: {url}")
 
         try: